@@ -2,12 +2,22 @@
 # -*- coding: utf-8 -*-
 """ARKWELL ADMIN CONTROL PANEL - WITH BACKUP PROTOCOL"""
 
+import json
+from contextlib import aclosing
+from typing import Optional
 from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import StreamingResponse
+from app.catalog import node_catalog
 from app.db import get_pool
+from app.entitlements import entitlement_bits, entitlement_cache, rebuild_entitlements, set_milestone
+from app.expiry import expiry_sweeper
 from app.ws import manager
 from app.enforcement import approve_access
-from app.backup_protocol import execute_backup_mission
+from app.backup_jobs import backup_scheduler
+from app.backup_protocol import arkwell_protocol, list_backups
+from app.backup_restore import restore_to_vault, verify_backups
 from app.logger import logger
+from app.rows import json_default
 
 router = APIRouter(prefix="/admin", tags=["Admin"])
 
@@ -29,69 +39,159 @@ async def pending_requests():
     return rows
 
 @router.post("/approve/{access_id}", dependencies=[Depends(require_admin)])
-async def admin_approve(access_id: str, approver_id: str = "ADMIN.AARON", role: str = "Admin"):
-    """APPROVE ACCESS REQUEST"""
-    db = get_pool()
-    
-    # FETCH ACCESS REQUEST
-    access = await db.fetchrow("SELECT * FROM user_node_access WHERE id=?", access_id)
-    if not access:
+async def admin_approve(access_id: str, approver_id: str = "ADMIN.AARON", role: str = "Admin",
+                        decision: str = "approved", comment: str = ""):
+    """VOTE ON AN ACCESS REQUEST - UNLOCKS ONCE THE NODE'S MULTISIG QUORUM IS MET"""
+    # VOTE, TALLY AND UNLOCK RUN IN ONE TRANSACTION
+    result = await approve_access(access_id, approver_id, role, decision=decision, comment=comment)
+    if result.get("error") == "access_not_found":
         raise HTTPException(404, "Access request not found")
+    if result.get("error") == "invalid_decision":
+        raise HTTPException(400, "decision must be 'approved' or 'rejected'")
+    if result.get("error") == "request_closed":
+        raise HTTPException(409, f"Access request is already {result['status']}")
+    if result.get("error") == "role_not_permitted":
+        raise HTTPException(403, f"Role {role!r} may not approve this node; allowed: {result['roles']}")
+    if "error" in result:
+        raise HTTPException(500, result["error"])
     
-    result = await approve_access(access_id, approver_id, role, decision="approved")
-    
-    # NOTIFY USER
-    owner = access["user_id"]
-    await manager.send_to_user(owner, {
-        "type": "access_granted", 
-        "node_code": await _get_node_code(db, access["node_id"]),
-        "status": result.get("status")
-    })
-    
-    await manager.broadcast_to_admins({
-        "event": "access_update", 
-        "access_id": access_id, 
-        "status": result.get("status")
-    })
+    # NOTIFY ONLY ON THE TRANSITION TO APPROVED
+    if result["transition"]:
+        await manager.broadcast_to_user(result["user_id"], {
+            "type": "access_granted", 
+            "node_code": result["node_code"],
+            "status": result.get("status")
+        })
+        
+        await manager.broadcast_to_admins({
+            "event": "access_update", 
+            "access_id": access_id, 
+            "status": result.get("status")
+        })
     
     return result
 
-@router.post("/backup", dependencies=[Depends(require_admin)])
-async def admin_trigger_backup():
+@router.post("/backup", status_code=202, dependencies=[Depends(require_admin)])
+async def admin_trigger_backup(mode: Optional[str] = None):
     """
     🚨 ARKWELL BACKUP PROTOCOL
-    Execute encrypted backup mission - returns cryptographic manifest
+    Queue an encrypted backup mission - returns a job id immediately
+    mode: "incremental" (default, chunk store) or "full" (self-contained .enc)
     """
     try:
-        manifest = await execute_backup_mission()
-        logger.info(f"🔐 ARKWELL BACKUP MISSION SUCCESS: {manifest['mission_id']}")
-        
-        return {
-            "status": "MISSION_SUCCESS",
-            "message": "ARKWELL ENCRYPTED BACKUP COMPLETE",
-            "manifest": manifest
-        }
-        
-    except Exception as e:
-        logger.error(f"❌ ARKWELL BACKUP MISSION FAILED: {e}")
-        raise HTTPException(500, f"BACKUP PROTOCOL FAILURE: {str(e)}")
+        job = backup_scheduler.submit(mode=mode)
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+    logger.info(f"🔐 ARKWELL BACKUP JOB QUEUED: {job.id}")
+    return {
+        "status": "MISSION_QUEUED",
+        "job_id": job.id,
+        "status_url": f"/admin/backup/jobs/{job.id}",
+    }
+
+@router.get("/backup/jobs", dependencies=[Depends(require_admin)])
+async def admin_backup_jobs():
+    """RECENT BACKUP JOBS, NEWEST FIRST"""
+    return [job.as_dict() for job in backup_scheduler.jobs()]
+
+@router.get("/backup/jobs/{job_id}", dependencies=[Depends(require_admin)])
+async def admin_backup_job(job_id: str):
+    """PROGRESS AND OUTCOME OF ONE BACKUP JOB"""
+    job = backup_scheduler.get(job_id)
+    if job is None:
+        raise HTTPException(404, "Backup job not found")
+    return job.as_dict()
+
+@router.get("/backup/catalog", dependencies=[Depends(require_admin)])
+async def admin_backup_catalog():
+    """EVERY BACKUP IN THE VAULT, NEWEST FIRST"""
+    return list_backups()
+
+@router.post("/backup/prune", dependencies=[Depends(require_admin)])
+async def admin_backup_prune():
+    """APPLY THE RETENTION POLICY NOW"""
+    return await arkwell_protocol.prune_backups(backup_scheduler.keep_hourly, backup_scheduler.keep_daily)
+
+@router.post("/backup/gc", dependencies=[Depends(require_admin)])
+async def admin_backup_gc():
+    """SWEEP VAULT CHUNKS NO LONGER REFERENCED BY ANY MANIFEST"""
+    return await arkwell_protocol.collect_garbage()
+
+@router.post("/backup/verify", dependencies=[Depends(require_admin)])
+async def admin_backup_verify(mission_id: Optional[str] = None):
+    """CHECK EVERY CHUNK OF ONE BACKUP (OR ALL, WITHOUT mission_id) - NO PLAINTEXT WRITTEN"""
+    _require_cataloged(mission_id)
+    results = await verify_backups(mission_id)
+    return {"ok": all(r["ok"] for r in results), "results": results}
+
+@router.post("/backup/restore/{mission_id}", dependencies=[Depends(require_admin)])
+async def admin_backup_restore(mission_id: str):
+    """RESTORE INTO arkwell_vaults/restored/ AND RUN INTEGRITY + ROW-COUNT CHECKS"""
+    _require_cataloged(mission_id)
+    return await restore_to_vault(mission_id)
 
-async def _get_node_code(db, node_id):
-    row = await db.fetchrow("SELECT code FROM nodes WHERE id=?", node_id)
-    return row["code"] if row else None
+def _require_cataloged(mission_id: Optional[str]):
+    # Only catalogued ids reach the filesystem
+    if mission_id is not None and not any(e["mission_id"] == mission_id for e in list_backups()):
+        raise HTTPException(404, "Backup not found")
+
+@router.post("/entitlements/rebuild", dependencies=[Depends(require_admin)])
+async def admin_entitlements_rebuild():
+    """REGENERATE user_entitlements FROM THE ACCESS HISTORY, THEN RELOAD THE IN-MEMORY COPIES"""
+    result = await rebuild_entitlements()
+    entitlement_cache.clear()
+    await entitlement_bits.load()
+    return result
+
+@router.post("/milestones/{user_id}/{name}", dependencies=[Depends(require_admin)])
+async def admin_grant_milestone(user_id: str, name: str, source: str = "admin"):
+    """RECORD A USER MILESTONE (glyph, pull_mode, initiation...) THAT NODE requires CHAINS CHECK"""
+    return _milestone_result(await set_milestone(user_id, name, held=True, source=source))
+
+@router.delete("/milestones/{user_id}/{name}", dependencies=[Depends(require_admin)])
+async def admin_withdraw_milestone(user_id: str, name: str):
+    """WITHDRAW A USER MILESTONE"""
+    return _milestone_result(await set_milestone(user_id, name, held=False))
+
+def _milestone_result(result):
+    if result.get("error") == "milestones_unavailable":
+        raise HTTPException(503, "user_milestones table missing (migrations/0009_user_milestones.sql)")
+    return result
+
+@router.post("/expiry/sweep", dependencies=[Depends(require_admin)])
+async def admin_expiry_sweep():
+    """EXPIRE EVERY GRANT PAST ITS expires_at NOW, WITHOUT WAITING FOR THE SWEEPER"""
+    return await expiry_sweeper.sweep()
+
+@router.get("/metrics/db", dependencies=[Depends(require_admin)])
+async def db_metrics():
+    """DB EXECUTOR / POOL SATURATION METRICS, PLUS THE NODE CATALOG AND ENTITLEMENT CACHE"""
+    return {**get_pool().metrics(), "catalog": node_catalog.stats(), "entitlements": entitlement_cache.stats(),
+            "entitlement_bitsets": entitlement_bits.stats(), "expiry": expiry_sweeper.stats()}
 
 # DATA BROWSER ENDPOINTS
+async def _json_array(rows):
+    """ENCODE AN ASYNC ROW STREAM AS A JSON ARRAY, ONE ROW AT A TIME"""
+    async with aclosing(rows):
+        yield "["
+        first = True
+        async for row in rows:
+            yield ("" if first else ",") + json.dumps(row, default=json_default)
+            first = False
+        yield "]"
+
+def _stream_rows(query: str, *params) -> StreamingResponse:
+    db = get_pool()
+    return StreamingResponse(_json_array(db.iterate(query, *params)), media_type="application/json")
+
 @router.get("/inspect/nodes", dependencies=[Depends(require_admin)])
 async def inspect_nodes():
-    db = get_pool()
-    return await db.fetch("SELECT * FROM nodes ORDER BY tier, code")
+    return _stream_rows("SELECT * FROM nodes ORDER BY tier, code")
 
 @router.get("/inspect/users", dependencies=[Depends(require_admin)])
 async def inspect_users():
-    db = get_pool()
-    return await db.fetch("SELECT * FROM users ORDER BY id")
+    return _stream_rows("SELECT * FROM users ORDER BY id")
 
 @router.get("/inspect/access", dependencies=[Depends(require_admin)])
 async def inspect_access(limit: int = 200):
-    db = get_pool()
-    return await db.fetch("SELECT * FROM user_node_access ORDER BY created_at DESC LIMIT ?", limit)
\ No newline at end of file
+    return _stream_rows("SELECT * FROM user_node_access ORDER BY created_at DESC LIMIT ?", limit)
@@ -0,0 +1,433 @@
+# -*- coding: utf-8 -*-
+"""ARKWELL BACKUP FORMATS - STREAMING, CONSTANT MEMORY
+
+Two formats: a self-contained framed .enc file per backup (full backups)
+and a content-addressed chunk store shared by incremental backups (below).
+
+Layout of an .enc file:
+
+    MAGIC (8 bytes) | frame | frame | ...
+    frame = uint32 big-endian length | Fernet token
+
+Each token encrypts one compressed plaintext chunk. Chunks are sealed
+(hash -> compress -> encrypt -> hash) in a process pool and come back in
+input order, so only a bounded window of chunks is ever in memory and the
+output is byte-for-byte what a single worker would produce.
+
+Digests are hash trees so every worker can hash its own chunk: the
+plaintext digest is the SHA-256 of the ordered per-chunk plaintext
+SHA-256s, and the file fingerprint is the SHA-256 of MAGIC followed by the
+ordered frame SHA-256s ("digest_scheme": "sha256-tree-v1"). Manifests
+without a digest_scheme predate this and hold flat SHA-256s.
+"""
+
+import hashlib
+import hmac
+import lzma
+import multiprocessing as mp
+import os
+import struct
+import time
+import zlib
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, BinaryIO, Callable, Dict, Iterator, List, Optional
+
+try:
+    from cryptography.fernet import Fernet, InvalidToken
+except ImportError:
+    Fernet = None
+    InvalidToken = None
+
+MAGIC = b"ARKWELL1"
+FORMAT = "arkwell-framed-v1"
+CIPHER = "Fernet (AES-128-CBC + HMAC-SHA256) per frame"
+CHUNK_SIZE_DEFAULT = 4 * 1024 * 1024
+ZLIB_LEVEL_DEFAULT = 6
+COMPRESSIONS = ("zlib", "lzma")
+COMPRESSION_DEFAULT = "zlib"
+COMPRESSION_LEVEL_DEFAULTS = {"zlib": ZLIB_LEVEL_DEFAULT, "lzma": 6}
+DIGEST_SCHEME = "sha256-tree-v1"
+WORKERS_DEFAULT = os.cpu_count() or 1
+_LEN = struct.Struct(">I")
+
+class BackupFormatError(ValueError):
+    """Raised when an .enc stream is malformed or fails verification."""
+
+def _require_crypto():
+    if Fernet is None:
+        raise RuntimeError("CRYPTO SYSTEMS OFFLINE - Run: pip install cryptography")
+
+def _compress(data: bytes, compression: str, level: int) -> bytes:
+    if compression == "zlib":
+        return zlib.compress(data, level)
+    if compression == "lzma":
+        return lzma.compress(data, preset=level)
+    raise ValueError(f"Unknown compression {compression!r}; expected one of {COMPRESSIONS}")
+
+def _decompress(data: bytes, compression: str) -> bytes:
+    if compression == "zlib":
+        return zlib.decompress(data)
+    if compression == "lzma":
+        return lzma.decompress(data)
+    raise BackupFormatError(f"Unknown compression {compression!r}")
+
+_XZ_MAGIC = b"\xfd7zXZ\x00"
+
+def _stored_compression(data: bytes, default: str) -> str:
+    """
+    The codec a compressed chunk was written with, read from its own header.
+
+    Store chunks are shared across backups whatever compression each backup
+    used, so the manifest's ``compression`` only describes the chunks that
+    backup added. zlib streams open with a CMF/FLG pair divisible by 31
+    (0x78 first for the default window); lzma.compress writes the xz magic.
+    """
+    if data.startswith(_XZ_MAGIC):
+        return "lzma"
+    if len(data) >= 2 and data[0] & 0x0F == 8 and (data[0] << 8 | data[1]) % 31 == 0:
+        return "zlib"
+    return default
+
+def open_token(token: bytes, key: bytes, compression: str = COMPRESSION_DEFAULT) -> bytes:
+    """Decrypt and decompress one frame or stored chunk."""
+    return _decompress(Fernet(key).decrypt(token), compression)
+
+def _open_chunk(index: int, token: Optional[bytes], path: Optional[str], key: bytes, compression: str,
+                expected_sha256: Optional[str], cid: Optional[str], keep_plain: bool) -> Dict[str, Any]:
+    """
+    Pool worker: the inverse of _seal_chunk for one frame or stored chunk.
+
+    Reads ``path`` when no token is given, checks the token against
+    ``expected_sha256`` and the plaintext against its chunk id ``cid``.
+    The plaintext is only sent back when ``keep_plain`` is set.
+    """
+    if token is None:
+        if not os.path.exists(path):
+            raise BackupFormatError(f"Chunk {index} ({cid}) missing from the vault")
+        with open(path, "rb") as f:
+            token = f.read()
+    if expected_sha256 is not None and hashlib.sha256(token).hexdigest() != expected_sha256:
+        raise BackupFormatError(f"Frame {index} digest mismatch")
+    try:
+        sealed = Fernet(key).decrypt(token)
+    except InvalidToken:
+        raise BackupFormatError(f"{'Chunk' if cid else 'Frame'} {index} failed authentication (tampered or wrong key)")
+    if cid is not None:
+        compression = _stored_compression(sealed, compression)
+    plain = _decompress(sealed, compression)
+    if cid is not None and not hmac.compare_digest(hmac.new(_id_key(key), plain, hashlib.sha256).hexdigest(), cid):
+        raise BackupFormatError(f"Chunk {index} ({cid}) content does not match its id")
+    return {"plain": plain if keep_plain else None, "plain_sha256": hashlib.sha256(plain).digest(),
+            "plain_size": len(plain)}
+
+def _seal_chunk(plain: bytes, key: bytes, compression: str, level: int,
+                store_dir: Optional[str]) -> Dict[str, Any]:
+    """
+    Pool worker: hash -> compress -> encrypt -> hash one chunk.
+
+    With ``store_dir`` the chunk goes to the content-addressed store: it is
+    only compressed and encrypted if the store lacks it, and the worker
+    writes it itself. Returns the token (framed mode), digests, sizes and
+    the time spent in each stage.
+    """
+    t0 = time.perf_counter()
+    plain_digest = hashlib.sha256(plain).digest()
+    cid = hmac.new(_id_key(key), plain, hashlib.sha256).hexdigest() if store_dir else None
+    t1 = time.perf_counter()
+    out = {"plain_size": len(plain), "plain_sha256": plain_digest, "id": cid, "token": None,
+           "stored": False, "compressed_size": 0, "size": 0, "token_sha256": None}
+    timings = {"hash": t1 - t0, "compress": 0.0, "encrypt": 0.0, "write": 0.0}
+    out["timings"] = timings
+    path = chunk_path(store_dir, cid) if store_dir else None
+    if path and os.path.exists(path):
+        return out
+    compressed = _compress(plain, compression, level)
+    t2 = time.perf_counter()
+    token = Fernet(key).encrypt(compressed)
+    t3 = time.perf_counter()
+    out["token_sha256"] = hashlib.sha256(token).hexdigest()
+    t4 = time.perf_counter()
+    out["compressed_size"] = len(compressed)
+    out["size"] = len(token)
+    timings["compress"] = t2 - t1
+    timings["encrypt"] = t3 - t2
+    timings["hash"] += t4 - t3
+    if path:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(token)
+        os.replace(tmp, path)
+        out["stored"] = True
+        timings["write"] = time.perf_counter() - t4
+    else:
+        out["token"] = token
+    return out
+
+def _ordered_map(fn, arg_iter, workers: int) -> Iterator[Any]:
+    """
+    Yield ``fn(*args)`` for each args tuple IN INPUT ORDER, over a process pool.
+
+    Up to ``2 * workers`` calls are in flight; ``arg_iter`` is only advanced
+    when the window has room, which bounds memory. ``workers <= 1`` runs
+    inline.
+    """
+    if workers <= 1:
+        for args in arg_iter:
+            yield fn(*args)
+        return
+    window = deque()
+    # spawn, not fork: the API process runs threads (DB executors, event loop)
+    with ProcessPoolExecutor(max_workers=workers, mp_context=mp.get_context("spawn")) as pool:
+        try:
+            for args in arg_iter:
+                window.append(pool.submit(fn, *args))
+                if len(window) >= 2 * workers:
+                    yield window.popleft().result()
+            while window:
+                yield window.popleft().result()
+        finally:
+            for future in window:
+                future.cancel()
+
+def _sealed_chunks(src: BinaryIO, key: bytes, chunk_size: int, compression: str, level: int,
+                   workers: int, stats: Dict[str, float], store_dir: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+    """
+    Read ``src`` in chunks and yield each sealed chunk IN INPUT ORDER.
+
+    Per-stage times are summed into ``stats`` (worker stages are summed
+    across processes, so they can exceed the wall time).
+    """
+    if compression not in COMPRESSIONS:
+        raise ValueError(f"Unknown compression {compression!r}; expected one of {COMPRESSIONS}")
+
+    def _reads():
+        while True:
+            t = time.perf_counter()
+            plain = src.read(chunk_size)
+            stats["read"] += time.perf_counter() - t
+            if not plain:
+                return
+            yield plain, key, compression, level, store_dir
+
+    for result in _ordered_map(_seal_chunk, _reads(), workers):
+        for stage, seconds in result.pop("timings").items():
+            stats[stage] += seconds
+        yield result
+
+def _pipeline_summary(compression: str, level: int, workers: int, plain_total: int, compressed_total: int,
+                      stats: Dict[str, float], started: float) -> Dict[str, Any]:
+    stats["total"] = time.perf_counter() - started
+    return {
+        "compression": compression,
+        "compression_level": level,
+        "compression_ratio": round(plain_total / compressed_total, 3) if compressed_total else None,
+        "workers": workers,
+        "digest_scheme": DIGEST_SCHEME,
+        "stage_seconds": {stage: round(seconds, 4) for stage, seconds in stats.items()},
+    }
+
+def _new_stats() -> Dict[str, float]:
+    return {"read": 0.0, "hash": 0.0, "compress": 0.0, "encrypt": 0.0, "write": 0.0}
+
+def encrypt_stream(src: BinaryIO, dst: BinaryIO, key: bytes, chunk_size: int = CHUNK_SIZE_DEFAULT,
+                   level: Optional[int] = None, compression: str = COMPRESSION_DEFAULT,
+                   workers: int = WORKERS_DEFAULT,
+                   progress: Optional[Callable[[int], None]] = None) -> Dict[str, Any]:
+    """
+    READ -> (HASH -> COMPRESS -> ENCRYPT -> HASH IN THE POOL) -> WRITE IN ORDER
+    progress(plaintext_bytes_done) is called after each chunk is written.
+    """
+    _require_crypto()
+    level = COMPRESSION_LEVEL_DEFAULTS.get(compression, 0) if level is None else level
+    started = time.perf_counter()
+    stats = _new_stats()
+    plain_tree = hashlib.sha256()
+    file_tree = hashlib.sha256(MAGIC)
+    chunks: List[Dict[str, Any]] = []
+    plain_total = compressed_total = 0
+    size = len(MAGIC)
+    dst.write(MAGIC)
+    for sealed in _sealed_chunks(src, key, chunk_size, compression, level, workers, stats):
+        t = time.perf_counter()
+        token = sealed["token"]
+        header = _LEN.pack(len(token))
+        dst.write(header)
+        dst.write(token)
+        stats["write"] += time.perf_counter() - t
+        plain_tree.update(sealed["plain_sha256"])
+        file_tree.update(bytes.fromhex(sealed["token_sha256"]))
+        plain_total += sealed["plain_size"]
+        compressed_total += sealed["compressed_size"]
+        size += len(header) + len(token)
+        chunks.append({"index": len(chunks), "sha256": sealed["token_sha256"],
+                       "size": len(token), "plain_size": sealed["plain_size"]})
+        if progress:
+            progress(plain_total)
+    return {
+        "format": FORMAT,
+        "encryption_cipher": CIPHER,
+        **_pipeline_summary(compression, level, workers, plain_total, compressed_total, stats, started),
+        "chunk_size": chunk_size,
+        "chunk_count": len(chunks),
+        "chunks": chunks,
+        "plaintext_bytes": plain_total,
+        "plaintext_sha256": plain_tree.hexdigest(),
+        "size_bytes": size,
+        "sha256_fingerprint": file_tree.hexdigest(),
+    }
+
+def iter_frames(src: BinaryIO):
+    """YIELD (index, token) FOR EVERY FRAME IN AN .enc STREAM"""
+    if src.read(len(MAGIC)) != MAGIC:
+        raise BackupFormatError("Not an ARKWELL framed backup (bad magic)")
+    index = 0
+    while True:
+        header = src.read(_LEN.size)
+        if not header:
+            return
+        if len(header) != _LEN.size:
+            raise BackupFormatError(f"Truncated frame header at frame {index}")
+        (length,) = _LEN.unpack(header)
+        token = src.read(length)
+        if len(token) != length:
+            raise BackupFormatError(f"Truncated frame {index}: expected {length} bytes, got {len(token)}")
+        yield index, token
+        index += 1
+
+class _PlainDigest:
+    """Plaintext digest matching the manifest's digest_scheme (tree or legacy flat)."""
+
+    def __init__(self, scheme: Optional[str]):
+        self.tree = scheme == DIGEST_SCHEME
+        self._hash = hashlib.sha256()
+
+    def add(self, opened: Dict[str, Any]):
+        self._hash.update(opened["plain_sha256"] if self.tree else opened["plain"])
+
+    def hexdigest(self) -> str:
+        return self._hash.hexdigest()
+
+def _write_opened(opened_iter: Iterator[Dict[str, Any]], dst: Optional[BinaryIO],
+                  digest: _PlainDigest) -> Dict[str, Any]:
+    count = plain_total = 0
+    for opened in opened_iter:
+        digest.add(opened)
+        plain_total += opened["plain_size"]
+        if dst is not None:
+            dst.write(opened["plain"])
+        count += 1
+    return {"chunk_count": count, "plaintext_bytes": plain_total, "plaintext_sha256": digest.hexdigest()}
+
+def decrypt_stream(src: BinaryIO, dst: Optional[BinaryIO], key: bytes,
+                   chunks: Optional[List[Dict[str, Any]]] = None, compression: str = COMPRESSION_DEFAULT,
+                   digest_scheme: Optional[str] = DIGEST_SCHEME, workers: int = 1) -> Dict[str, Any]:
+    """
+    STREAMING INVERSE OF encrypt_stream, ACROSS ``workers`` PROCESSES
+
+    Checks each frame against the manifest digests when ``chunks`` is given.
+    With ``dst=None`` nothing is written, which verifies a backup without
+    putting plaintext on disk.
+    """
+    _require_crypto()
+    digest = _PlainDigest(digest_scheme)
+    keep_plain = dst is not None or not digest.tree
+    count = 0
+
+    def _frames():
+        nonlocal count
+        for index, token in iter_frames(src):
+            if chunks is not None and index >= len(chunks):
+                raise BackupFormatError(f"Frame {index} is not in the manifest")
+            count += 1
+            yield index, token, None, key, compression, chunks[index]["sha256"] if chunks else None, None, keep_plain
+
+    result = _write_opened(_ordered_map(_open_chunk, _frames(), workers), dst, digest)
+    if chunks is not None and count != len(chunks):
+        raise BackupFormatError(f"Manifest lists {len(chunks)} frames, file has {count}")
+    return result
+
+def encrypt_file(src_path: str, dst_path: str, key: bytes, **kwargs) -> Dict[str, Any]:
+    with open(src_path, "rb") as src, open(dst_path, "wb") as dst:
+        return encrypt_stream(src, dst, key, **kwargs)
+
+def decrypt_file(src_path: str, dst_path: Optional[str], key: bytes,
+                 chunks: Optional[List[Dict[str, Any]]] = None, **kwargs) -> Dict[str, Any]:
+    with open(src_path, "rb") as src:
+        if dst_path is None:
+            return decrypt_stream(src, None, key, chunks, **kwargs)
+        with open(dst_path, "wb") as dst:
+            return decrypt_stream(src, dst, key, chunks, **kwargs)
+
+# CONTENT-ADDRESSED CHUNK STORE (INCREMENTAL BACKUPS)
+#
+# Chunks are stored once under an HMAC-SHA256 of their plaintext, keyed from
+# the vault key so chunk names reveal nothing about content. Each stored
+# object is the Fernet token of the compressed chunk. A chunk is reused by
+# later backups whatever their compression, so restores read each chunk's
+# codec from its own stream header (_stored_compression); the manifest's
+# compression only names what that backup wrote. A backup is then just its
+# ordered list of chunk ids.
+
+CAS_FORMAT = "arkwell-cas-v1"
+CAS_CHUNK_SIZE_DEFAULT = 256 * 1024
+
+def _id_key(key: bytes) -> bytes:
+    return hashlib.sha256(b"arkwell-cas-id:" + key).digest()
+
+def chunk_path(store_dir: str, cid: str) -> str:
+    return os.path.join(store_dir, cid[:2], cid)
+
+def cas_store_stream(src: BinaryIO, store_dir: str, key: bytes, chunk_size: int = CAS_CHUNK_SIZE_DEFAULT,
+                     level: Optional[int] = None, compression: str = COMPRESSION_DEFAULT,
+                     workers: int = WORKERS_DEFAULT,
+                     progress: Optional[Callable[[int], None]] = None) -> Dict[str, Any]:
+    """SPLIT src INTO FIXED-SIZE CHUNKS, STORING ONLY THOSE NOT ALREADY IN THE VAULT"""
+    _require_crypto()
+    level = COMPRESSION_LEVEL_DEFAULTS.get(compression, 0) if level is None else level
+    started = time.perf_counter()
+    stats = _new_stats()
+    plain_tree = hashlib.sha256()
+    refs: List[str] = []
+    seen = set()
+    plain_total = new_plain = compressed_total = new_chunks = new_bytes = 0
+    for sealed in _sealed_chunks(src, key, chunk_size, compression, level, workers, stats, store_dir):
+        cid = sealed["id"]
+        refs.append(cid)
+        plain_tree.update(sealed["plain_sha256"])
+        plain_total += sealed["plain_size"]
+        # the same new chunk can be sealed twice when copies are in flight together
+        if sealed["stored"] and cid not in seen:
+            new_chunks += 1
+            new_bytes += sealed["size"]
+            new_plain += sealed["plain_size"]
+            compressed_total += sealed["compressed_size"]
+        seen.add(cid)
+        if progress:
+            progress(plain_total)
+    # only new chunks are compressed, so the ratio covers exactly those bytes
+    summary = _pipeline_summary(compression, level, workers, new_plain, compressed_total, stats, started)
+    return {
+        "format": CAS_FORMAT,
+        "encryption_cipher": CIPHER,
+        **summary,
+        "chunk_size": chunk_size,
+        "chunk_count": len(refs),
+        "chunks": refs,
+        "new_chunks": new_chunks,
+        "new_bytes": new_bytes,
+        "plaintext_bytes": plain_total,
+        "plaintext_sha256": plain_tree.hexdigest(),
+    }
+
+def cas_restore_stream(refs: List[str], store_dir: str, key: bytes, dst: Optional[BinaryIO],
+                       compression: str = COMPRESSION_DEFAULT,
+                       digest_scheme: Optional[str] = DIGEST_SCHEME, workers: int = 1) -> Dict[str, Any]:
+    """REASSEMBLE A BACKUP FROM ITS CHUNK IDS, CHECKING EACH CHUNK AGAINST ITS ID"""
+    _require_crypto()
+    digest = _PlainDigest(digest_scheme)
+    keep_plain = dst is not None or not digest.tree
+    args = ((index, None, chunk_path(store_dir, cid), key, compression, None, cid, keep_plain)
+            for index, cid in enumerate(refs))
+    return _write_opened(_ordered_map(_open_chunk, args, workers), dst, digest)
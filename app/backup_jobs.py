@@ -0,0 +1,169 @@
+# app/backup_jobs.py
+"""Backups as background jobs.
+
+``POST /admin/backup`` submits a job and returns its id at once; the
+backup runs as an asyncio task (its blocking stages already run in
+executors) and reports progress on the job. ``BackupScheduler`` also
+submits a job every ARKWELL_BACKUP_INTERVAL_S seconds from the app
+lifespan, and applies the retention policy after each successful backup.
+Job state lives in memory; the backups themselves are in the vault catalog.
+"""
+import asyncio
+import os
+import uuid
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+from app.backup_protocol import BACKUP_MODE, BACKUP_MODES, arkwell_protocol
+from app.logger import logger
+
+BACKUP_INTERVAL_S = float(os.getenv("ARKWELL_BACKUP_INTERVAL_S", "3600"))  # 0 disables the schedule
+RETAIN_HOURLY = int(os.getenv("ARKWELL_RETAIN_HOURLY", "24"))
+RETAIN_DAILY = int(os.getenv("ARKWELL_RETAIN_DAILY", "7"))
+JOB_HISTORY = int(os.getenv("ARKWELL_BACKUP_JOB_HISTORY", "100"))
+SHUTDOWN_GRACE_S = float(os.getenv("ARKWELL_BACKUP_SHUTDOWN_GRACE_S", "30"))
+
+def _now() -> str:
+    return datetime.utcnow().isoformat(timespec="seconds") + "Z"
+
+class BackupJob:
+    """One backup run. Progress fields are set from executor threads."""
+
+    def __init__(self, mode: str, trigger: str):
+        self.id = uuid.uuid4().hex
+        self.mode = mode
+        self.trigger = trigger
+        self.status = "queued"  # queued -> running -> succeeded | failed
+        self.phase = "queued"   # queued -> snapshot -> encrypt -> prune -> done
+        self.created_at = _now()
+        self.started_at: Optional[str] = None
+        self.finished_at: Optional[str] = None
+        self.pages_done = self.pages_total = 0
+        self.bytes_processed = self.bytes_total = 0
+        self.mission_id: Optional[str] = None
+        self.manifest_file: Optional[str] = None
+        self.retention: Optional[Dict[str, Any]] = None
+        self.error: Optional[str] = None
+
+    def _snapshot_progress(self, done: int, total: int):
+        self.phase = "snapshot"
+        self.pages_done, self.pages_total = done, total
+
+    def _stream_progress(self, done: int, total: int):
+        self.phase = "encrypt"
+        self.bytes_processed, self.bytes_total = done, total
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "job_id": self.id,
+            "mode": self.mode,
+            "trigger": self.trigger,
+            "status": self.status,
+            "phase": self.phase,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "pages_done": self.pages_done,
+            "pages_total": self.pages_total,
+            "bytes_processed": self.bytes_processed,
+            "bytes_total": self.bytes_total,
+            "percent": round(100.0 * self.bytes_processed / self.bytes_total, 1) if self.bytes_total else 0.0,
+            "mission_id": self.mission_id,
+            "manifest_file": self.manifest_file,
+            "retention": self.retention,
+            "error": self.error,
+        }
+
+class BackupScheduler:
+    def __init__(self, interval_s: float = BACKUP_INTERVAL_S, keep_hourly: int = RETAIN_HOURLY,
+                 keep_daily: int = RETAIN_DAILY, history: int = JOB_HISTORY):
+        self.interval_s = interval_s
+        self.keep_hourly = keep_hourly
+        self.keep_daily = keep_daily
+        self.history = max(1, history)
+        self._jobs: "OrderedDict[str, BackupJob]" = OrderedDict()
+        self._tasks: set = set()
+        self._loop_task: Optional[asyncio.Task] = None
+
+    def submit(self, mode: Optional[str] = None, trigger: str = "manual") -> BackupJob:
+        """Start a backup job in the background and return it immediately."""
+        mode = mode or BACKUP_MODE
+        if mode not in BACKUP_MODES:
+            raise ValueError(f"UNKNOWN BACKUP MODE {mode!r}; expected one of {BACKUP_MODES}")
+        job = BackupJob(mode, trigger)
+        self._jobs[job.id] = job
+        while len(self._jobs) > self.history:
+            oldest = next(iter(self._jobs.values()))
+            if oldest.status in ("queued", "running"):
+                break
+            self._jobs.popitem(last=False)
+        task = asyncio.create_task(self._run(job))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return job
+
+    async def _run(self, job: BackupJob):
+        job.status = "running"
+        job.started_at = _now()
+        try:
+            manifest = await arkwell_protocol.create_encrypted_backup(
+                progress=job._snapshot_progress, mode=job.mode, stream_progress=job._stream_progress
+            )
+            job.mission_id = manifest["mission_id"]
+            job.manifest_file = manifest["manifest_file"]
+            job.status = "succeeded"
+            logger.info(f"🔐 BACKUP JOB {job.id} SUCCESS: {job.mission_id}")
+        except Exception as e:
+            job.status = "failed"
+            job.error = str(e)
+            logger.error(f"❌ BACKUP JOB {job.id} FAILED: {e}")
+        if job.status == "succeeded":
+            # A failed prune is logged on the job but does not fail the backup
+            job.phase = "prune"
+            try:
+                job.retention = await arkwell_protocol.prune_backups(self.keep_hourly, self.keep_daily)
+            except Exception as e:
+                job.retention = {"error": str(e)}
+                logger.error(f"❌ BACKUP RETENTION FAILED: {e}")
+        job.phase = "done"
+        job.finished_at = _now()
+
+    def get(self, job_id: str) -> Optional[BackupJob]:
+        return self._jobs.get(job_id)
+
+    def jobs(self) -> List[BackupJob]:
+        """Newest first."""
+        return list(reversed(self._jobs.values()))
+
+    def active(self) -> bool:
+        return any(job.status in ("queued", "running") for job in self._jobs.values())
+
+    async def _schedule(self):
+        while True:
+            await asyncio.sleep(self.interval_s)
+            if self.active():
+                logger.info("[Backup] Scheduled backup skipped: a backup job is still running")
+                continue
+            self.submit(trigger="scheduled")
+
+    def start(self):
+        if self.interval_s > 0 and self._loop_task is None:
+            self._loop_task = asyncio.create_task(self._schedule())
+            logger.info(f"[Backup] Scheduler started: every {self.interval_s:g}s, "
+                        f"keep {self.keep_hourly} hourly / {self.keep_daily} daily")
+
+    async def stop(self):
+        """Stop scheduling and give running jobs SHUTDOWN_GRACE_S to finish."""
+        if self._loop_task is not None:
+            self._loop_task.cancel()
+            try:
+                await self._loop_task
+            except asyncio.CancelledError:
+                pass
+            self._loop_task = None
+        if self._tasks:
+            _, pending = await asyncio.wait(self._tasks, timeout=SHUTDOWN_GRACE_S)
+            if pending:
+                logger.warning(f"[Backup] {len(pending)} backup job(s) still running at shutdown")
+
+backup_scheduler = BackupScheduler()
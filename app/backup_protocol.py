@@ -3,11 +3,19 @@
 
 import os
 import asyncio
-import hashlib
+import glob
 import json
+import queue
+import sqlite3
+import time
+import uuid
 from datetime import datetime
-from typing import Dict, Any
+from typing import Callable, Dict, Any, List, Optional
 import aiofiles
+from app.backup_codec import (
+    BackupFormatError, CAS_CHUNK_SIZE_DEFAULT, CAS_FORMAT, CHUNK_SIZE_DEFAULT, COMPRESSION_DEFAULT, COMPRESSIONS, WORKERS_DEFAULT,
+    cas_restore_stream, cas_store_stream, decrypt_file, encrypt_file, encrypt_stream,
+)
 
 # CRYPTOGRAPHIC WEAPONS SYSTEMS
 try:
@@ -15,9 +23,186 @@ try:
 except ImportError:
     Fernet = None
 
+try:
+    import asyncpg
+except ImportError:
+    asyncpg = None
+
 # MISSION PARAMETERS
 BACKUP_DIR = "arkwell_vaults"
-DB_PATH = "sovereign_kingdom.db"
+DB_PATH = os.environ.get("SOVEREIGN_DB", "sovereign_kingdom.db")
+# POSTGRES: WHEN SET, BACKUPS STREAM EVERY TABLE OUT WITH COPY INSTEAD OF SNAPSHOTTING DB_PATH
+PG_DSN = os.environ.get("DATABASE_URL")
+PG_COPY_SCHEMA = os.environ.get("ARKWELL_PG_BACKUP_SCHEMA", "public")
+PG_COPY_QUEUE = int(os.environ.get("ARKWELL_PG_COPY_QUEUE", "64"))  # COPY BUFFERS IN FLIGHT TO THE PIPELINE
+# ONLINE SNAPSHOT: PAGES COPIED PER BACKUP STEP AND PAUSE BETWEEN STEPS
+BACKUP_PAGES_PER_STEP = int(os.environ.get("ARKWELL_BACKUP_PAGES_PER_STEP", "256"))
+BACKUP_STEP_PAUSE_MS = float(os.environ.get("ARKWELL_BACKUP_STEP_PAUSE_MS", "5"))
+# STREAMING ENCRYPTION: PLAINTEXT BYTES PER FRAME
+BACKUP_CHUNK_SIZE = int(os.environ.get("ARKWELL_BACKUP_CHUNK_SIZE", str(CHUNK_SIZE_DEFAULT)))
+# INCREMENTAL MODE: SHARED CHUNK STORE + VAULT-WIDE KEY
+BACKUP_MODES = ("incremental", "full")
+BACKUP_MODE = os.environ.get("ARKWELL_BACKUP_MODE", "incremental")
+CHUNK_STORE_DIR = os.path.join(BACKUP_DIR, "chunks")
+CAS_CHUNK_SIZE = int(os.environ.get("ARKWELL_CAS_CHUNK_SIZE", str(CAS_CHUNK_SIZE_DEFAULT)))
+VAULT_KEY_PATH = os.environ.get("ARKWELL_VAULT_KEY_FILE", os.path.join(BACKUP_DIR, "vault.key"))
+CATALOG_PATH = os.path.join(BACKUP_DIR, "catalog.json")
+# PARALLEL PIPELINE: COMPRESSOR, LEVEL (BLANK = CODEC DEFAULT) AND WORKER PROCESSES
+BACKUP_COMPRESSION = os.environ.get("ARKWELL_BACKUP_COMPRESSION", COMPRESSION_DEFAULT)
+BACKUP_COMPRESSION_LEVEL = int(os.environ["ARKWELL_BACKUP_LEVEL"]) if os.environ.get("ARKWELL_BACKUP_LEVEL") else None
+BACKUP_WORKERS = int(os.environ.get("ARKWELL_BACKUP_WORKERS", str(WORKERS_DEFAULT)))
+
+ProgressCallback = Callable[[int, int], None]
+
+def snapshot_sqlite(src_path: str, dest_path: str, pages_per_step: int = BACKUP_PAGES_PER_STEP,
+                    pause_ms: float = BACKUP_STEP_PAUSE_MS,
+                    progress: Optional[ProgressCallback] = None) -> Dict[str, Any]:
+    """
+    COPY A CONSISTENT SNAPSHOT OF src_path INTO dest_path (BLOCKING - RUN IN AN EXECUTOR)
+
+    Uses the SQLite online backup API. The source connection pins one read
+    transaction for the whole copy, so the snapshot is consistent and the
+    backup never restarts; in WAL mode that reader does not block writers,
+    who commit freely between steps. The copy sleeps pause_ms between steps
+    (the backup API's own sleep only applies after SQLITE_BUSY/LOCKED), so a
+    large database yields the disk to live traffic. progress(pages_done,
+    pages_total) is called after every step. Row counts per table are taken
+    from the copy so a restore can be checked against them.
+    """
+    steps = 0
+    total = 0
+    pause = max(0.0, pause_ms) / 1000.0
+
+    def _step(status, remaining, pages):
+        nonlocal steps, total
+        steps += 1
+        total = pages
+        if progress:
+            progress(pages - remaining, pages)
+        if remaining and pause:
+            time.sleep(pause)  # THROTTLE: BREATHE BETWEEN STEPS
+
+    src = sqlite3.connect(src_path, isolation_level=None)
+    dst = sqlite3.connect(dest_path)
+    try:
+        src.execute("BEGIN")
+        src.execute("SELECT COUNT(1) FROM sqlite_master").fetchone()  # pin the read snapshot
+        src.backup(dst, pages=max(1, pages_per_step), progress=_step, sleep=pause)
+        src.execute("COMMIT")
+        row_counts = table_row_counts(dst)
+    finally:
+        dst.close()
+        src.close()
+    return {"method": "sqlite_online_backup", "pages": total, "steps": steps,
+            "pages_per_step": pages_per_step, "row_counts": row_counts}
+
+def table_row_counts(conn: sqlite3.Connection) -> Dict[str, int]:
+    """ROWS PER USER TABLE"""
+    tables = [r[0] for r in conn.execute(
+        "SELECT name FROM sqlite_master WHERE type='table' AND name NOT LIKE 'sqlite_%' ORDER BY name"
+    )]
+    return {t: conn.execute(f'SELECT COUNT(*) FROM "{t}"').fetchone()[0] for t in tables}
+
+class CopyPipe:
+    """
+    BOUNDED BRIDGE FROM ASYNC COPY OUTPUT TO THE BLOCKING CHUNK PIPELINE
+
+    asyncpg hands COPY data to write() on the event loop; the pipeline reads
+    it with read() in an executor thread. At most PG_COPY_QUEUE buffers wait
+    in between - when the pipeline falls behind, write() waits too, which
+    throttles COPY instead of buffering whole tables. fail() unblocks both
+    sides when either one dies.
+    """
+
+    def __init__(self, max_buffers: int = PG_COPY_QUEUE):
+        self._queue = queue.Queue(maxsize=max(1, max_buffers))
+        self._buffer = bytearray()
+        self._eof = False
+        self._error: Optional[BaseException] = None
+        self.bytes_written = 0
+
+    async def write(self, data: bytes):
+        data = bytes(data)
+        self.bytes_written += len(data)
+        await self._offer(data)
+
+    async def _offer(self, item):
+        try:
+            self._queue.put_nowait(item)
+        except queue.Full:
+            await asyncio.get_event_loop().run_in_executor(None, self._put, item)
+
+    def _put(self, item):
+        while True:
+            if self._error is not None:
+                raise self._error
+            try:
+                self._queue.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    async def close(self):
+        """END OF STREAM - WAITS OFF THE LOOP WHEN THE PIPE IS FULL"""
+        await self._offer(None)
+
+    def fail(self, exc: BaseException):
+        self._error = exc
+        try:
+            self._queue.put_nowait(None)  # wake a blocked reader
+        except queue.Full:
+            pass
+
+    def read(self, n: int) -> bytes:
+        """RETURN EXACTLY n BYTES UNLESS THE STREAM HAS ENDED (BLOCKING)"""
+        while len(self._buffer) < n and not self._eof:
+            item = self._queue.get()
+            if self._error is not None:
+                raise self._error
+            if item is None:
+                self._eof = True
+            else:
+                self._buffer += item
+        out = bytes(self._buffer[:n])
+        del self._buffer[:n]
+        return out
+
+    def feed(self, consume: Callable[["CopyPipe"], Dict[str, Any]]) -> Dict[str, Any]:
+        """RUN consume(self) IN THE CALLING THREAD, FAILING THE PIPE IF IT DIES"""
+        try:
+            return consume(self)
+        except BaseException as e:
+            self.fail(e)
+            raise
+
+async def copy_postgres(dsn: str, pipe: CopyPipe, schema: str = PG_COPY_SCHEMA) -> Dict[str, Any]:
+    """
+    STREAM EVERY BASE TABLE IN schema INTO pipe WITH COPY ... TO STDOUT (BINARY)
+
+    All tables are copied inside one REPEATABLE READ, READ ONLY transaction,
+    so together they form one consistent snapshot. Returns the snapshot
+    section of the manifest: each table's byte range in the plaintext
+    stream (needed to split it again on restore) and its row count.
+    """
+    if asyncpg is None:
+        raise RuntimeError("POSTGRES DRIVER OFFLINE - Run: pip install asyncpg")
+    conn = await asyncpg.connect(dsn)
+    try:
+        async with conn.transaction(isolation="repeatable_read", readonly=True):
+            names = [r["table_name"] for r in await conn.fetch(
+                "SELECT table_name FROM information_schema.tables "
+                "WHERE table_schema = $1 AND table_type = 'BASE TABLE' ORDER BY table_name", schema
+            )]
+            tables = []
+            for name in names:
+                offset = pipe.bytes_written
+                status = await conn.copy_from_table(name, schema_name=schema, output=pipe.write, format="binary")
+                tables.append({"name": name, "offset": offset, "bytes": pipe.bytes_written - offset,
+                               "rows": int(status.split()[-1])})
+    finally:
+        await conn.close()
+    return {"method": "postgres_copy_binary", "schema": schema, "tables": tables,
+            "row_counts": {t["name"]: t["rows"] for t in tables}}
 
 class ArkwellBackupProtocol:
     def __init__(self):
@@ -28,74 +213,367 @@ class ArkwellBackupProtocol:
         os.makedirs(BACKUP_DIR, exist_ok=True)
         print(f"🛡️ ARKWELL VAULT ESTABLISHED: {BACKUP_DIR}")
 
-    async def create_encrypted_backup(self) -> Dict[str, Any]:
+    async def create_encrypted_backup(self, progress: Optional[ProgressCallback] = None,
+                                      mode: Optional[str] = None,
+                                      stream_progress: Optional[ProgressCallback] = None) -> Dict[str, Any]:
         """
         EXECUTE MISSION: ENCRYPTED DATA EXFILTRATION
         Returns cryptographic manifest for verification
+
+        mode "incremental" stores only chunks the vault does not already hold;
+        mode "full" writes a self-contained .enc/.key pair.
+        progress(pages_done, pages_total) tracks the snapshot and
+        stream_progress(bytes_done, bytes_total) the encryption pipeline.
         """
-        if not os.path.exists(DB_PATH):
+        mode = mode or BACKUP_MODE
+        if mode not in BACKUP_MODES:
+            raise ValueError(f"UNKNOWN BACKUP MODE {mode!r}; expected one of {BACKUP_MODES}")
+        if BACKUP_COMPRESSION not in COMPRESSIONS:
+            raise ValueError(f"UNKNOWN COMPRESSION {BACKUP_COMPRESSION!r}; expected one of {COMPRESSIONS}")
+
+        if not PG_DSN and not os.path.exists(DB_PATH):
             raise FileNotFoundError(f"MISSION DATA NOT FOUND: {DB_PATH}")
 
         if Fernet is None:
             raise RuntimeError("CRYPTO SYSTEMS OFFLINE - Run: pip install cryptography")
 
-        print("🔐 INITIATING ARKWELL ENCRYPTION PROTOCOL...")
-        
-        # PHASE 1: ACQUIRE DATA ASSET
-        async with aiofiles.open(DB_PATH, "rb") as f:
-            db_bytes = await f.read()
-        
-        # PHASE 2: GENERATE ENCRYPTION KEY
-        encryption_key = Fernet.generate_key()
-        cipher_suite = Fernet(encryption_key)
-        
-        # PHASE 3: EXECUTE ENCRYPTION
-        encrypted_data = await asyncio.get_event_loop().run_in_executor(
-            None, cipher_suite.encrypt, db_bytes
-        )
-        
-        # PHASE 4: SECURE STORAGE
-        timestamp = datetime.utcnow().strftime("%Y%m%dT%H%M%SZ")
-        mission_id = f"arkwell_backup_{timestamp}"
-        
-        backup_path = os.path.join(BACKUP_DIR, f"{mission_id}.enc")
-        key_path = os.path.join(BACKUP_DIR, f"{mission_id}.key")
-        manifest_path = os.path.join(BACKUP_DIR, f"{mission_id}.manifest.json")
+        print(f"🔐 INITIATING ARKWELL ENCRYPTION PROTOCOL ({mode.upper()})...")
+        loop = asyncio.get_event_loop()
         
-        # STORE ENCRYPTED ASSET
-        async with aiofiles.open(backup_path, "wb") as f:
-            await f.write(encrypted_data)
-        
-        # STORE DECRYPTION KEY SEPARATELY
-        async with aiofiles.open(key_path, "wb") as f:
-            await f.write(encryption_key)
-        
-        # PHASE 5: GENERATE MISSION MANIFEST
-        data_hash = hashlib.sha256(encrypted_data).hexdigest()
-        
-        manifest = {
-            "mission_id": mission_id,
-            "timestamp_utc": timestamp,
-            "backup_file": backup_path,
-            "key_file": key_path,
-            "manifest_file": manifest_path,
-            "sha256_fingerprint": data_hash,
-            "size_bytes": len(encrypted_data),
-            "encryption_cipher": "AES-256-GCM",
-            "status": "MISSION_SUCCESS",
-            "notes": "ARKWELL PROTOCOL: Keys stored separately from data"
-        }
-        
-        # RECORD MISSION MANIFEST
-        async with aiofiles.open(manifest_path, "w", encoding="utf-8") as f:
-            await f.write(json.dumps(manifest, indent=2))
+        async with _vault_lock:
+            # MISSION IDS ARE NEVER REUSED: MICROSECOND STAMP PLUS A RANDOM SUFFIX, SO AN ID
+            # ALREADY PRUNED (OR A CLOCK STEPPING BACK) CAN NEVER HAND OUT THE SAME NAME TWICE
+            timestamp = datetime.utcnow().strftime("%Y%m%dT%H%M%S.%fZ")
+            mission_id = f"arkwell_backup_{timestamp.replace('.', '')}_{uuid.uuid4().hex[:8]}"
+            
+            manifest_path = os.path.join(BACKUP_DIR, f"{mission_id}.manifest.json")
+            
+            # PHASE 1: ENCRYPTION KEY (PER BACKUP FOR FULL, VAULT-WIDE FOR INCREMENTAL)
+            if mode == "full":
+                encryption_key = Fernet.generate_key()
+                key_path = os.path.join(BACKUP_DIR, f"{mission_id}.key")
+            else:
+                encryption_key = load_vault_key()
+                key_path = VAULT_KEY_PATH
+            
+            if PG_DSN:
+                # PHASES 2+3: COPY EVERY TABLE STRAIGHT INTO THE PIPELINE, NOTHING STAGED ON DISK
+                snapshot, stream = await self._stream_postgres(mode, mission_id, encryption_key, stream_progress)
+            else:
+                snapshot, stream = await self._stream_sqlite(mode, mission_id, encryption_key,
+                                                             progress, stream_progress)
+            stream["stage_seconds"]["snapshot"] = snapshot["seconds"]
+            if mode == "incremental":
+                print(f"🧩 {stream['new_chunks']}/{stream['chunk_count']} CHUNKS NEW "
+                      f"({stream['new_bytes']} BYTES STORED)")
+            print(f"⚙️ {stream['workers']} WORKERS, {stream['compression'].upper()} RATIO "
+                  f"{stream['compression_ratio']}, PIPELINE {stream['stage_seconds']['total']}s")
+            
+            # PHASE 4: STORE DECRYPTION KEY SEPARATELY
+            if mode == "full":
+                async with aiofiles.open(key_path, "wb") as f:
+                    await f.write(encryption_key)
+            
+            # PHASE 5: GENERATE MISSION MANIFEST
+            manifest = {
+                "mission_id": mission_id,
+                "timestamp_utc": timestamp,
+                "mode": mode,
+                "key_file": key_path,
+                "manifest_file": manifest_path,
+                "snapshot": snapshot,
+                **stream,
+                "status": "MISSION_SUCCESS",
+                "notes": "ARKWELL PROTOCOL: Keys stored separately from data"
+            }
+            
+            # RECORD MISSION MANIFEST, THEN CATALOG IT
+            async with aiofiles.open(manifest_path, "w", encoding="utf-8") as f:
+                await f.write(json.dumps(manifest, indent=2))
+            await loop.run_in_executor(None, catalog_add, manifest)
         
         print(f"✅ ARKWELL BACKUP MISSION SUCCESS: {mission_id}")
         return manifest
 
+    async def _stream_sqlite(self, mode: str, mission_id: str, key: bytes,
+                             progress: Optional[ProgressCallback],
+                             stream_progress: Optional[ProgressCallback]):
+        """ONLINE SNAPSHOT TO A TEMP FILE, THEN THE CHUNK PIPELINE OVER IT"""
+        loop = asyncio.get_event_loop()
+        snapshot_path = os.path.join(BACKUP_DIR, f"{mission_id}.snapshot")
+        try:
+            # PHASE 2: ACQUIRE DATA ASSET (CONSISTENT ONLINE SNAPSHOT, WRITERS KEEP RUNNING)
+            started = time.perf_counter()
+            snapshot = await loop.run_in_executor(
+                None, lambda: snapshot_sqlite(DB_PATH, snapshot_path, progress=progress)
+            )
+            snapshot["seconds"] = round(time.perf_counter() - started, 4)
+            print(f"📸 SNAPSHOT ACQUIRED: {snapshot['pages']} pages in {snapshot['steps']} steps")
+            
+            # PHASE 3: COMPRESS -> ENCRYPT -> HASH ACROSS WORKER PROCESSES, WRITTEN BACK IN ORDER
+            options = _pipeline_options()
+            if stream_progress:
+                total = os.path.getsize(snapshot_path)
+                options["progress"] = lambda done: stream_progress(done, total)
+            if mode == "full":
+                backup_path = os.path.join(BACKUP_DIR, f"{mission_id}.enc")
+                stream = await loop.run_in_executor(
+                    None, lambda: encrypt_file(snapshot_path, backup_path, key,
+                                               chunk_size=BACKUP_CHUNK_SIZE, **options)
+                )
+                stream["backup_file"] = backup_path
+            else:
+                stream = await loop.run_in_executor(None, _store_chunks, snapshot_path, key, options)
+                stream["chunk_store"] = CHUNK_STORE_DIR
+        finally:
+            if os.path.exists(snapshot_path):
+                os.remove(snapshot_path)
+        return snapshot, stream
+
+    async def _stream_postgres(self, mode: str, mission_id: str, key: bytes,
+                               stream_progress: Optional[ProgressCallback]):
+        """COPY ON THE EVENT LOOP FEEDS THE CHUNK PIPELINE IN AN EXECUTOR THROUGH A BOUNDED PIPE"""
+        loop = asyncio.get_event_loop()
+        pipe = CopyPipe()
+        options = _pipeline_options()
+        if stream_progress:
+            options["progress"] = lambda done: stream_progress(done, 0)  # total unknown until COPY ends
+        backup_path = os.path.join(BACKUP_DIR, f"{mission_id}.enc")
+        if mode == "full":
+            def consume(src):
+                with open(backup_path, "wb") as dst:
+                    return encrypt_stream(src, dst, key, chunk_size=BACKUP_CHUNK_SIZE, **options)
+        else:
+            def consume(src):
+                return cas_store_stream(src, CHUNK_STORE_DIR, key, chunk_size=CAS_CHUNK_SIZE, **options)
+        
+        consumer = loop.run_in_executor(None, pipe.feed, consume)
+        started = time.perf_counter()
+        try:
+            snapshot = await copy_postgres(PG_DSN, pipe)
+            await pipe.close()
+            stream = await consumer
+        except BaseException as e:
+            pipe.fail(e)
+            try:
+                await consumer
+            except BaseException:
+                pass
+            if os.path.exists(backup_path):
+                os.remove(backup_path)
+            raise
+        snapshot["seconds"] = round(time.perf_counter() - started, 4)
+        print(f"📸 COPY COMPLETE: {len(snapshot['tables'])} tables, "
+              f"{sum(snapshot['row_counts'].values())} rows")
+        if mode == "full":
+            stream["backup_file"] = backup_path
+        else:
+            stream["chunk_store"] = CHUNK_STORE_DIR
+        return snapshot, stream
+
+    async def prune_backups(self, keep_hourly: int, keep_daily: int) -> Dict[str, Any]:
+        """APPLY THE RETENTION POLICY, THEN SWEEP CHUNKS ONLY PRUNED BACKUPS USED"""
+        async with _vault_lock:
+            result = await asyncio.get_event_loop().run_in_executor(
+                None, prune_backups_sync, keep_hourly, keep_daily
+            )
+        if result["pruned"]:
+            print(f"🗑️ RETENTION: {len(result['pruned'])} BACKUPS PRUNED, {result['kept']} KEPT")
+        return result
+
+    async def collect_garbage(self) -> Dict[str, Any]:
+        """DELETE VAULT CHUNKS THAT NO MANIFEST REFERENCES"""
+        async with _vault_lock:
+            result = await asyncio.get_event_loop().run_in_executor(None, collect_garbage_sync)
+        print(f"🧹 VAULT GC: {result['removed']} CHUNKS REMOVED, {result['freed_bytes']} BYTES FREED")
+        return result
+
+def load_vault_key() -> bytes:
+    """LOAD (OR CREATE ONCE) THE VAULT-WIDE KEY FOR THE CHUNK STORE"""
+    if not os.path.exists(VAULT_KEY_PATH):
+        os.makedirs(os.path.dirname(VAULT_KEY_PATH) or ".", exist_ok=True)
+        fd = os.open(VAULT_KEY_PATH, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+        with os.fdopen(fd, "wb") as f:
+            f.write(Fernet.generate_key())
+    with open(VAULT_KEY_PATH, "rb") as f:
+        return f.read().strip()
+
+def _pipeline_options() -> Dict[str, Any]:
+    return {"compression": BACKUP_COMPRESSION, "level": BACKUP_COMPRESSION_LEVEL, "workers": BACKUP_WORKERS}
+
+def _store_chunks(snapshot_path: str, key: bytes, options: Dict[str, Any]) -> Dict[str, Any]:
+    with open(snapshot_path, "rb") as src:
+        return cas_store_stream(src, CHUNK_STORE_DIR, key, chunk_size=CAS_CHUNK_SIZE, **options)
+
+def _manifest_paths():
+    return sorted(glob.glob(os.path.join(BACKUP_DIR, "*.manifest.json")))
+
+def collect_garbage_sync() -> Dict[str, Any]:
+    """
+    MARK AND SWEEP THE CHUNK STORE (BLOCKING)
+    Callers must hold _vault_lock so no backup is mid-write.
+    """
+    referenced = set()
+    for path in _manifest_paths():
+        with open(path, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+        if manifest.get("format") == CAS_FORMAT:
+            referenced.update(manifest["chunks"])
+    removed = freed = 0
+    if os.path.isdir(CHUNK_STORE_DIR):
+        for prefix in os.listdir(CHUNK_STORE_DIR):
+            bucket = os.path.join(CHUNK_STORE_DIR, prefix)
+            for name in os.listdir(bucket):
+                if name in referenced:
+                    continue
+                path = os.path.join(bucket, name)
+                freed += os.path.getsize(path)
+                os.remove(path)
+                removed += 1
+            if not os.listdir(bucket):
+                os.rmdir(bucket)
+    return {"referenced": len(referenced), "removed": removed, "freed_bytes": freed}
+
+# BACKUP CATALOG
+#
+# One JSON index of every backup in the vault, so listing never globs or
+# parses manifests. Mutated only under _vault_lock; rebuilt from the
+# manifests on first use if missing.
+
+CATALOG_FIELDS = (
+    "mission_id", "timestamp_utc", "mode", "format", "manifest_file", "backup_file", "key_file",
+    "size_bytes", "new_bytes", "plaintext_bytes", "chunk_count", "compression", "compression_ratio", "status",
+)
+_catalog: Optional[List[Dict[str, Any]]] = None
+
+def _catalog_entry(manifest: Dict[str, Any]) -> Dict[str, Any]:
+    return {field: manifest.get(field) for field in CATALOG_FIELDS}
+
+def _save_catalog():
+    tmp = f"{CATALOG_PATH}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump({"backups": _catalog}, f, indent=2)
+    os.replace(tmp, CATALOG_PATH)
+
+def load_catalog() -> List[Dict[str, Any]]:
+    """CATALOG ENTRIES, OLDEST FIRST (LOADED ONCE, THEN SERVED FROM MEMORY)"""
+    global _catalog
+    if _catalog is None:
+        if os.path.exists(CATALOG_PATH):
+            with open(CATALOG_PATH, "r", encoding="utf-8") as f:
+                _catalog = json.load(f)["backups"]
+        else:
+            entries = []
+            for path in _manifest_paths():
+                with open(path, "r", encoding="utf-8") as f:
+                    entries.append(_catalog_entry(json.load(f)))
+            _catalog = sorted(entries, key=lambda e: (_stamp(e), e["mission_id"]))
+            _save_catalog()
+    return _catalog
+
+def catalog_add(manifest: Dict[str, Any]):
+    entries = load_catalog()
+    # A catalog rebuilt just now already holds this manifest
+    if not any(e["mission_id"] == manifest["mission_id"] for e in entries):
+        entries.append(_catalog_entry(manifest))
+        _save_catalog()
+
+def list_backups() -> List[Dict[str, Any]]:
+    """NEWEST FIRST"""
+    return list(reversed(load_catalog()))
+
+# RETENTION: KEEP THE NEWEST BACKUP IN EACH OF THE LATEST N HOURS AND M DAYS
+
+def _stamp(entry: Dict[str, Any]) -> str:
+    # OLDER MANIFESTS STAMP WHOLE SECONDS ("...SSZ"); DROPPING THE Z SORTS THEM BEFORE THAT SECOND'S FRACTIONS
+    return (entry["timestamp_utc"] or "").rstrip("Z")
+
+def select_retained(entries: List[Dict[str, Any]], keep_hourly: int, keep_daily: int) -> set:
+    """MISSION IDS TO KEEP UNDER A GRANDFATHER-STYLE HOURLY/DAILY POLICY
+
+    ENTRIES COME OLDEST FIRST (CATALOG ORDER); EQUAL TIMESTAMPS GO BY THAT
+    ORDER, NEVER BY ID, SO THE LATEST BACKUP WRITTEN IS THE ONE KEPT.
+    """
+    keep = set()
+    hours, days = set(), set()
+    ordered = sorted(enumerate(entries), key=lambda ie: (_stamp(ie[1]), ie[0]), reverse=True)
+    for _, entry in ordered:
+        stamp = entry["timestamp_utc"] or ""
+        hour, day = stamp[:11], stamp[:8]  # YYYYMMDDTHH / YYYYMMDD
+        if hour not in hours and len(hours) < keep_hourly:
+            hours.add(hour)
+            keep.add(entry["mission_id"])
+        if day not in days and len(days) < keep_daily:
+            days.add(day)
+            keep.add(entry["mission_id"])
+    return keep
+
+def prune_backups_sync(keep_hourly: int, keep_daily: int) -> Dict[str, Any]:
+    """
+    DELETE BACKUPS OUTSIDE THE RETENTION POLICY (BLOCKING)
+    Callers must hold _vault_lock. Both limits at 0 disables pruning. The
+    manifest goes first, so an interrupted prune leaves orphaned data for
+    the next run rather than a manifest pointing at nothing; the vault-wide
+    key is never touched.
+    """
+    entries = load_catalog()
+    if keep_hourly <= 0 and keep_daily <= 0:
+        return {"pruned": [], "kept": len(entries), "freed_bytes": 0, "gc": None}
+    keep = select_retained(entries, keep_hourly, keep_daily)
+    pruned, freed, sweep = [], 0, False
+    for entry in entries:
+        if entry["mission_id"] in keep:
+            continue
+        for suffix in (".manifest.json", ".enc", ".key"):
+            path = os.path.join(BACKUP_DIR, f"{entry['mission_id']}{suffix}")
+            if os.path.exists(path):
+                freed += os.path.getsize(path)
+                os.remove(path)
+        sweep = sweep or entry.get("format") == CAS_FORMAT
+        pruned.append(entry["mission_id"])
+    if pruned:
+        entries[:] = [e for e in entries if e["mission_id"] in keep]
+        _save_catalog()
+    gc = collect_garbage_sync() if sweep else None
+    if gc:
+        freed += gc["freed_bytes"]
+    return {"pruned": pruned, "kept": len(entries), "freed_bytes": freed, "gc": gc}
+
 # GLOBAL PROTOCOL INSTANCE
 arkwell_protocol = ArkwellBackupProtocol()
+# SERIALISES BACKUPS AND GC OVER THE SHARED CHUNK STORE
+_vault_lock = asyncio.Lock()
 
-async def execute_backup_mission():
+async def execute_backup_mission(progress: Optional[ProgressCallback] = None, mode: Optional[str] = None):
     """PUBLIC INTERFACE FOR BACKUP PROTOCOL"""
-    return await arkwell_protocol.create_encrypted_backup()
\ No newline at end of file
+    return await arkwell_protocol.create_encrypted_backup(progress=progress, mode=mode)
+
+def read_manifest(manifest_path: str) -> Dict[str, Any]:
+    with open(manifest_path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+def decrypt_backup(manifest_path: str, out_path: Optional[str], workers: int = 1) -> Dict[str, Any]:
+    """
+    STREAM-DECRYPT A BACKUP FROM ITS MANIFEST (BLOCKING)
+    Verifies every frame/chunk and the plaintext SHA-256; out_path=None verifies only.
+    """
+    manifest = read_manifest(manifest_path)
+    if "format" not in manifest:
+        raise BackupFormatError(f"MANIFEST PREDATES THE STREAMING FORMATS: {manifest.get('mission_id')}")
+    with open(manifest["key_file"], "rb") as f:
+        key = f.read().strip()
+    # MANIFESTS WITHOUT THESE FIELDS PREDATE THE PARALLEL PIPELINE (ZLIB, FLAT SHA-256)
+    options = {"compression": manifest.get("compression", "zlib"),
+               "digest_scheme": manifest.get("digest_scheme"), "workers": workers}
+    if manifest["format"] == CAS_FORMAT:
+        store = manifest.get("chunk_store", CHUNK_STORE_DIR)
+        if out_path is None:
+            result = cas_restore_stream(manifest["chunks"], store, key, None, **options)
+        else:
+            with open(out_path, "wb") as dst:
+                result = cas_restore_stream(manifest["chunks"], store, key, dst, **options)
+    else:
+        result = decrypt_file(manifest["backup_file"], out_path, key, manifest["chunks"], **options)
+    if result["plaintext_sha256"] != manifest["plaintext_sha256"]:
+        raise BackupFormatError(f"PLAINTEXT DIGEST MISMATCH: {manifest['mission_id']}")
+    return result
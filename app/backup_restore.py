@@ -0,0 +1,168 @@
+# app/backup_restore.py
+"""Restore and verify ARKWELL backups from their manifests.
+
+    python -m app.backup_restore verify arkwell_vaults/<mission>.manifest.json
+    python -m app.backup_restore verify --all        # every backup in the catalog
+    python -m app.backup_restore restore arkwell_vaults/<mission>.manifest.json restored.db
+
+Frames/chunks are decrypted and checked across ARKWELL_RESTORE_WORKERS
+processes (default: cpu count) and reassembled in order. ``verify`` checks
+every chunk digest and the plaintext digest without writing plaintext to
+disk. ``restore`` writes the SQLite file, runs PRAGMA integrity_check and
+compares per-table row counts with those recorded at backup time; a
+restore that fails a check is left at ``<out>.partial``. Postgres (COPY)
+backups can be verified here but not restored to a SQLite file.
+"""
+import argparse
+import asyncio
+import os
+import sqlite3
+import sys
+import time
+from typing import Any, Dict, List, Optional
+
+from app.backup_codec import WORKERS_DEFAULT, BackupFormatError
+from app.backup_protocol import (
+    BACKUP_DIR, _vault_lock, decrypt_backup, list_backups, read_manifest, table_row_counts,
+)
+
+RESTORE_WORKERS = int(os.getenv("ARKWELL_RESTORE_WORKERS", str(WORKERS_DEFAULT)))
+RESTORE_DIR = os.path.join(BACKUP_DIR, "restored")
+
+def manifest_path_for(mission_id: str) -> str:
+    return os.path.join(BACKUP_DIR, f"{mission_id}.manifest.json")
+
+def _failure(e: Exception) -> str:
+    return f"{type(e).__name__}: {e}" if str(e) else type(e).__name__
+
+def verify_backup(manifest_path: str, workers: int = RESTORE_WORKERS) -> Dict[str, Any]:
+    """Check every chunk and the plaintext digest; nothing is written (blocking)."""
+    started = time.perf_counter()
+    result: Dict[str, Any] = {"manifest_file": manifest_path, "mission_id": None, "ok": False}
+    try:
+        result["mission_id"] = read_manifest(manifest_path).get("mission_id")
+        result.update(decrypt_backup(manifest_path, None, workers=workers))
+        result["ok"] = True
+    except Exception as e:
+        result["error"] = _failure(e)
+    result["seconds"] = round(time.perf_counter() - started, 3)
+    return result
+
+def verify_all(workers: int = RESTORE_WORKERS) -> List[Dict[str, Any]]:
+    """verify_backup for every backup in the catalog, newest first (blocking)."""
+    return [verify_backup(manifest_path_for(e["mission_id"]), workers) for e in list_backups()]
+
+def check_restored(db_path: str, expected_counts: Optional[Dict[str, int]]) -> Dict[str, Any]:
+    """PRAGMA integrity_check plus a per-table row-count comparison."""
+    conn = sqlite3.connect(db_path)
+    try:
+        integrity = [r[0] for r in conn.execute("PRAGMA integrity_check")]
+        counts = table_row_counts(conn)
+    finally:
+        conn.close()
+    mismatches = {}
+    if expected_counts is not None:
+        for table in sorted(set(expected_counts) | set(counts)):
+            if expected_counts.get(table) != counts.get(table):
+                mismatches[table] = {"expected": expected_counts.get(table), "restored": counts.get(table)}
+    return {
+        "integrity_check": integrity,
+        "row_counts": counts,
+        "row_counts_checked": expected_counts is not None,
+        "row_count_mismatches": mismatches,
+        "ok": integrity == ["ok"] and not mismatches,
+    }
+
+def restore_backup(manifest_path: str, out_path: str, workers: int = RESTORE_WORKERS,
+                   overwrite: bool = False) -> Dict[str, Any]:
+    """Decrypt a backup to ``out_path`` and check the restored database (blocking)."""
+    if os.path.exists(out_path) and not overwrite:
+        raise FileExistsError(f"Refusing to overwrite {out_path}")
+    started = time.perf_counter()
+    partial = f"{out_path}.partial"
+    result: Dict[str, Any] = {"manifest_file": manifest_path, "mission_id": None, "out_path": out_path, "ok": False}
+    try:
+        manifest = read_manifest(manifest_path)
+        result["mission_id"] = manifest.get("mission_id")
+        if manifest.get("snapshot", {}).get("method") == "postgres_copy_binary":
+            raise BackupFormatError("Postgres COPY backups cannot be restored to SQLite; use verify")
+        os.makedirs(os.path.dirname(os.path.abspath(out_path)), exist_ok=True)
+        result.update(decrypt_backup(manifest_path, partial, workers=workers))
+        result.update(check_restored(partial, manifest.get("snapshot", {}).get("row_counts")))
+        if result["ok"]:
+            os.replace(partial, out_path)
+        else:
+            result["out_path"] = partial
+    except Exception as e:
+        result["ok"] = False
+        result["error"] = _failure(e)
+        if os.path.exists(partial):
+            result["out_path"] = partial
+    result["seconds"] = round(time.perf_counter() - started, 3)
+    return result
+
+# ASYNC ENTRY POINTS (ADMIN API): HOLD THE VAULT LOCK SO PRUNING/GC CANNOT PULL CHUNKS MID-READ
+
+async def verify_backups(mission_id: Optional[str] = None) -> List[Dict[str, Any]]:
+    loop = asyncio.get_event_loop()
+    async with _vault_lock:
+        if mission_id is None:
+            return await loop.run_in_executor(None, verify_all)
+        return [await loop.run_in_executor(None, verify_backup, manifest_path_for(mission_id))]
+
+async def restore_to_vault(mission_id: str) -> Dict[str, Any]:
+    """Restore into arkwell_vaults/restored/<mission_id>.db, replacing an earlier restore."""
+    out_path = os.path.join(RESTORE_DIR, f"{mission_id}.db")
+    async with _vault_lock:
+        return await asyncio.get_event_loop().run_in_executor(
+            None, lambda: restore_backup(manifest_path_for(mission_id), out_path, overwrite=True)
+        )
+
+def _print_result(result: Dict[str, Any]):
+    status = "OK  " if result["ok"] else "FAIL"
+    line = f"{status} {result.get('mission_id') or result['manifest_file']}"
+    if "chunk_count" in result:
+        line += f"  {result['chunk_count']} chunks, {result['plaintext_bytes']} bytes"
+    line += f"  {result['seconds']}s"
+    if result.get("error"):
+        line += f"  {result['error']}"
+    for table, m in result.get("row_count_mismatches", {}).items():
+        line += f"\n     rows {table}: expected {m['expected']}, restored {m['restored']}"
+    if result.get("integrity_check") not in (None, ["ok"]):
+        line += f"\n     integrity_check: {'; '.join(result['integrity_check'][:5])}"
+    if result.get("out_path") and result["ok"]:
+        line += f"\n     restored to {result['out_path']}"
+    print(line)
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--workers", type=int, default=RESTORE_WORKERS, help="decrypt/verify processes")
+    sub = ap.add_subparsers(dest="command", required=True)
+    verify = sub.add_parser("verify", help="check backups without writing plaintext")
+    verify.add_argument("manifests", nargs="*")
+    verify.add_argument("--all", action="store_true", help="verify every backup in the catalog")
+    restore = sub.add_parser("restore", help="restore a backup to a SQLite file and check it")
+    restore.add_argument("manifest")
+    restore.add_argument("out")
+    restore.add_argument("--force", action="store_true", help="overwrite an existing output file")
+    args = ap.parse_args(argv)
+
+    if args.command == "restore":
+        if os.path.exists(args.out) and not args.force:
+            print(f"{args.out} exists; pass --force to overwrite", file=sys.stderr)
+            return 2
+        results = [restore_backup(args.manifest, args.out, args.workers, overwrite=args.force)]
+    else:
+        if not args.all and not args.manifests:
+            ap.error("verify needs manifest paths or --all")
+        results = verify_all(args.workers) if args.all else [verify_backup(m, args.workers) for m in args.manifests]
+
+    for result in results:
+        _print_result(result)
+    failed = sum(1 for r in results if not r["ok"])
+    if len(results) > 1:
+        print(f"{len(results) - failed}/{len(results)} backups OK")
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
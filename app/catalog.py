@@ -0,0 +1,154 @@
+# app/catalog.py
+"""In-process node catalog.
+
+The nodes table changes rarely, so every node is loaded once and served
+from memory, keyed by both ``code`` and ``id``, with each policy already
+compiled (app/policy_compiler). Each snapshot carries the ``catalog_version`` row that
+triggers on ``nodes`` bump (migrations/0003). At most once every
+SOVEREIGN_CATALOG_CHECK_MS the catalog reads that row (one primary-key
+lookup) and reloads only if it moved. Hot-path node lookups otherwise never
+touch the database.
+
+Snapshots are immutable: a reload builds a new one and swaps it in, so a
+caller holding a snapshot sees a consistent catalog. Node dicts and their
+policies are shared and must not be mutated.
+
+Every node id also gets a small integer index, stable for the life of the
+process, so a user's entitlements fit in one int bitset (``bit_for``;
+app/entitlements). User milestones named in ``requires`` chains get one as
+well (app/prerequisites).
+"""
+import asyncio
+import os
+import time
+from typing import Any, Callable, Dict, List, Optional
+from app.db import get_pool, is_missing_table
+from app.logger import logger
+from app.policy_compiler import PolicyError, compile_policy, invalid_policy
+from app.prerequisites import PrerequisiteGraph
+
+CATALOG_CHECK_MS = float(os.getenv("SOVEREIGN_CATALOG_CHECK_MS", "1000"))
+
+_VERSION_QUERY = "SELECT version FROM catalog_version WHERE name = 'nodes'"
+_NODES_QUERY = "SELECT id, code, label, tier, is_active, policy FROM nodes ORDER BY tier, code"
+
+def _node(row: Any, bit: int) -> Dict[str, Any]:
+    policy = None
+    try:
+        # compact rows decode the JSON column on access, so a malformed policy can fail here
+        policy = row["policy"]
+        rule = compile_policy(policy, row["tier"])
+    except ValueError as e:  # PolicyError, or json.JSONDecodeError from a compact row
+        if not isinstance(e, PolicyError):
+            e = PolicyError(f"policy is not valid JSON: {e}")
+        logger.warning(f"[Catalog] Node {row['code']} has an invalid policy, denying new access: {e}")
+        rule = invalid_policy(policy, e)
+    return {"id": row["id"], "code": row["code"], "label": row["label"], "tier": row["tier"],
+            "is_active": row["is_active"], "policy": rule.source, "rule": rule, "bit": bit}
+
+class CatalogSnapshot:
+    __slots__ = ("version", "nodes", "by_code", "by_id", "tier_masks", "graph", "invalid", "loaded_at")
+
+    def __init__(self, version: Optional[int], nodes: List[Dict[str, Any]], bit_for: Callable[[str], int]):
+        self.version = version
+        self.nodes = nodes  # tier, code order
+        self.by_code = {n["code"]: n for n in nodes}
+        self.by_id = {n["id"]: n for n in nodes}
+        self.tier_masks: Dict[int, int] = {}
+        for n in nodes:
+            self.tier_masks[n["tier"]] = self.tier_masks.get(n["tier"], 0) | n["bit"]
+        self.graph = PrerequisiteGraph(nodes, bit_for)
+        if self.graph.cyclic:
+            cycle = ", ".join(self.graph.cycle_codes())
+            logger.error(f"[Catalog] Prerequisite cycle, denying new access to: {cycle}")
+            for node_id in self.graph.cyclic:
+                node = self.by_id[node_id]
+                node["rule"] = invalid_policy(node["policy"], PolicyError(f"prerequisite cycle through {cycle}"))
+        for code, names in self.graph.milestones.items():
+            logger.info(f"[Catalog] Node {code} requires user milestones: {', '.join(names)}")
+        self.invalid = [n["code"] for n in nodes if n["rule"].kind == "invalid"]
+        self.loaded_at = time.time()
+
+class NodeCatalog:
+    def __init__(self, check_ms: float = CATALOG_CHECK_MS):
+        self.check_interval = max(0.0, check_ms) / 1000.0
+        self._snapshot: Optional[CatalogSnapshot] = None
+        self._next_check = 0.0
+        self._lock = asyncio.Lock()
+        self._versioned = True
+        self._bit_index: Dict[str, int] = {}
+        self.loads = 0
+        self.checks = 0
+
+    async def current(self) -> CatalogSnapshot:
+        """The catalog, re-validated against the version row at most once per check interval."""
+        if self._snapshot is not None and time.monotonic() < self._next_check:
+            return self._snapshot
+        async with self._lock:
+            if self._snapshot is None or time.monotonic() >= self._next_check:
+                await self._refresh()
+        return self._snapshot
+
+    async def load(self) -> CatalogSnapshot:
+        """Force a check (and reload if the version moved); used at startup."""
+        self.invalidate()
+        return await self.current()
+
+    def bit_for(self, node_id: str) -> int:
+        """Bitset mask for a node. Indexes are handed out once per process and never reused."""
+        index = self._bit_index.get(node_id)
+        if index is None:
+            index = self._bit_index[node_id] = len(self._bit_index)
+        return 1 << index
+
+    def bits_for(self, node_ids) -> int:
+        mask = 0
+        for node_id in node_ids:
+            mask |= self.bit_for(node_id)
+        return mask
+
+    def invalidate(self):
+        """Make the next lookup check the version row (for in-process writes to nodes)."""
+        self._next_check = 0.0
+
+    async def _refresh(self):
+        db = get_pool()
+        version = None
+        if self._versioned:
+            try:
+                version = await db.fetchval(_VERSION_QUERY)
+            except Exception as e:
+                if not is_missing_table(e):
+                    if self._snapshot is None:
+                        raise
+                    # Transient (saturated executor, locked database): keep serving, retry next check
+                    logger.warning(f"[Catalog] Version check failed, keeping version {self._snapshot.version}: {e}")
+                    self._next_check = time.monotonic() + self.check_interval
+                    return
+                # No version table (a Postgres schema without migration 0003): reload every interval
+                self._versioned = False
+                logger.warning(f"[Catalog] No catalog_version table ({e}); reloading nodes every check")
+        self.checks += 1
+        if self._snapshot is None or version is None or version != self._snapshot.version:
+            rows = await db.fetch(_NODES_QUERY)
+            nodes = [_node(r, self.bit_for(r["id"])) for r in rows]
+            self._snapshot = CatalogSnapshot(version, nodes, self.bit_for)
+            self.loads += 1
+            logger.info(f"[Catalog] Loaded {len(nodes)} nodes (version {version})")
+        self._next_check = time.monotonic() + self.check_interval
+
+    def stats(self) -> Dict[str, Any]:
+        snap = self._snapshot
+        return {
+            "version": snap.version if snap else None,
+            "nodes": len(snap.nodes) if snap else 0,
+            "invalid_policies": snap.invalid if snap else [],
+            "prerequisites": snap.graph.stats() if snap else None,
+            "loaded_at": snap.loaded_at if snap else None,
+            "check_interval_ms": self.check_interval * 1000,
+            "checks": self.checks,
+            "loads": self.loads,
+            "bit_indexes": len(self._bit_index),
+        }
+
+node_catalog = NodeCatalog()
@@ -1,25 +1,172 @@
 import os
+import sqlite3
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, List, Optional
 import asyncpg
-from app.persistence import logger
+from app import persistence
+from app.persistence import ITERATE_CHUNK_DEFAULT, logger
+from app.sql import POSTGRES, compile_sql
 
-_pg_pool: Optional[asyncpg.pool.Pool] = None
+PG_POOL_MIN = int(os.getenv("PG_POOL_MIN", "2"))
+PG_POOL_MAX = int(os.getenv("PG_POOL_MAX", "10"))
+PG_STATEMENT_CACHE = int(os.getenv("PG_STATEMENT_CACHE_SIZE", "256"))
+
+def _pg(query: str) -> str:
+    return compile_sql(query, POSTGRES)
+
+def is_missing_table(exc: BaseException) -> bool:
+    """Whether a query failed because its table does not exist (either backend)."""
+    if isinstance(exc, asyncpg.exceptions.UndefinedTableError):
+        return True
+    return isinstance(exc, sqlite3.OperationalError) and "no such table" in str(exc)
+
+def is_missing_conflict_target(exc: BaseException) -> bool:
+    """Whether an ON CONFLICT upsert failed because no unique index matches its target."""
+    if isinstance(exc, asyncpg.exceptions.InvalidColumnReferenceError):
+        return True
+    return isinstance(exc, sqlite3.OperationalError) and "does not match any PRIMARY KEY or UNIQUE" in str(exc)
+
+class SchemaProbe:
+    """Which of the access-path tables added by later SQLite migrations this database has.
+
+    The Postgres schema is managed outside migrations/, so it can lack them;
+    callers fall back to the older tables instead of failing. Probed once
+    (one ``SELECT ... LIMIT 1`` per table), then served from memory.
+    """
+
+    def __init__(self, tables):
+        self.tables = tuple(tables)
+        self._found: Optional[Dict[str, bool]] = None
+
+    async def probe(self) -> Dict[str, bool]:
+        if self._found is None:
+            db = get_pool()
+            found = {}
+            for table in self.tables:
+                try:
+                    await db.fetchval(f"SELECT 1 FROM {table} LIMIT 1")
+                    found[table] = True
+                except Exception as e:
+                    if not is_missing_table(e):
+                        raise
+                    found[table] = False
+            missing = [t for t, present in found.items() if not present]
+            if missing:
+                logger.warning(f"[Schema] Missing {', '.join(missing)}; access checks use the fallback paths")
+            self._found = found
+        return self._found
+
+    def reset(self):
+        self._found = None
+
+# catalog_version: migrations/0003, 0008; user_entitlements: 0004;
+# user_node_approval_tallies: 0005; user_milestones: 0009
+access_schema = SchemaProbe(("catalog_version", "user_entitlements", "user_node_approval_tallies", "user_milestones"))
+
+class PostgresTransaction:
+    """Unit of work on one acquired asyncpg connection; queries are compiled for Postgres."""
+
+    def __init__(self, conn: asyncpg.Connection):
+        self.conn = conn
+
+    async def fetchrow(self, query: str, *params) -> Optional[Dict[str, Any]]:
+        r = await self.conn.fetchrow(_pg(query), *params)
+        return dict(r) if r else None
+
+    async def fetch(self, query: str, *params) -> List[Dict[str, Any]]:
+        return [dict(r) for r in await self.conn.fetch(_pg(query), *params)]
+
+    async def fetchval(self, query: str, *params) -> Any:
+        return await self.conn.fetchval(_pg(query), *params)
+
+    async def execute(self, query: str, *params) -> None:
+        await self.conn.execute(_pg(query), *params)
+
+    async def executemany(self, query: str, args) -> None:
+        await self.conn.executemany(_pg(query), args)
+
+class PostgresDatabase:
+    """asyncpg pool exposing the same surface as SovereignSQLite.
+
+    Queries are SQLite-syntax templates (see app.sql); each is compiled once
+    for Postgres and then served from asyncpg's prepared-statement cache.
+    """
+    dialect = POSTGRES
+
+    def __init__(self, pool: asyncpg.pool.Pool):
+        self.pool = pool
+
+    async def fetchrow(self, query: str, *params) -> Optional[Dict[str, Any]]:
+        r = await self.pool.fetchrow(_pg(query), *params)
+        return dict(r) if r else None
+
+    async def fetch(self, query: str, *params) -> List[Dict[str, Any]]:
+        return [dict(r) for r in await self.pool.fetch(_pg(query), *params)]
+
+    async def fetchval(self, query: str, *params) -> Any:
+        return await self.pool.fetchval(_pg(query), *params)
+
+    async def execute(self, query: str, *params) -> None:
+        await self.pool.execute(_pg(query), *params)
+
+    async def execute_returning(self, query: str, *params) -> List[Dict[str, Any]]:
+        return [dict(r) for r in await self.pool.fetch(_pg(query), *params)]
+
+    async def executemany(self, query: str, args) -> None:
+        await self.pool.executemany(_pg(query), args)
+
+    @asynccontextmanager
+    async def transaction(self):
+        """Run a unit of work on one pooled connection inside BEGIN/COMMIT."""
+        async with self.pool.acquire() as conn:
+            async with conn.transaction():
+                yield PostgresTransaction(conn)
+
+    async def iterate(self, query: str, *params, chunk_size: int = ITERATE_CHUNK_DEFAULT) -> AsyncIterator[Dict[str, Any]]:
+        """Stream rows through a server-side cursor, ``chunk_size`` rows per fetch."""
+        async with self.pool.acquire() as conn:
+            async with conn.transaction():
+                cur = await conn.cursor(_pg(query), *params)
+                while True:
+                    rows = await cur.fetch(chunk_size)
+                    if not rows:
+                        break
+                    for r in rows:
+                        yield dict(r)
+
+    def metrics(self) -> Dict[str, Any]:
+        """Pool occupancy (asyncpg does its own queueing on acquire)."""
+        return {"pool": {
+            "size": self.pool.get_size(),
+            "idle": self.pool.get_idle_size(),
+            "min_size": self.pool.get_min_size(),
+            "max_size": self.pool.get_max_size(),
+        }}
+
+    async def close(self):
+        await self.pool.close()
+
+_pg_pool: Optional[PostgresDatabase] = None
 
 async def setup_db_pool():
     global _pg_pool
+    access_schema.reset()
     db_url = os.getenv("DATABASE_URL")
     if db_url:
-        _pg_pool = await asyncpg.create_pool(dsn=db_url)
+        pool = await asyncpg.create_pool(dsn=db_url, min_size=PG_POOL_MIN, max_size=PG_POOL_MAX,
+                                         statement_cache_size=PG_STATEMENT_CACHE)
+        _pg_pool = PostgresDatabase(pool)
         logger.info("[Postgres] Connection pool initialized")
         return _pg_pool
     else:
         # fallback to SQLite
-        return await setup_sqlite_pool()
+        return await persistence.setup_db_pool()
 
 def get_pool():
     if _pg_pool:
         return _pg_pool
     else:
-        raise RuntimeError("Database not initialized. Call setup_db_pool() first.")
+        return persistence.get_pool()
 
 async def shutdown_db_pool():
     global _pg_pool
@@ -27,3 +174,5 @@ async def shutdown_db_pool():
         await _pg_pool.close()
         logger.info("[Postgres] Connection pool shutdown")
         _pg_pool = None
+    else:
+        await persistence.shutdown_db_pool()
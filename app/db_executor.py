@@ -0,0 +1,125 @@
+# app/db_executor.py
+"""Bounded thread pool owned by the database layer.
+
+Database work no longer shares the loop's default executor. Each
+``DBExecutor`` has a fixed worker count and a bounded queue: once
+``workers + max_queue`` calls are pending, new work is rejected with
+``DBExecutorSaturated`` instead of piling up. Queue wait and run time are
+recorded per query.
+"""
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict
+
+class DBExecutorSaturated(RuntimeError):
+    """Raised when a DB executor's queue is full."""
+
+class _QueryStats:
+    __slots__ = ("calls", "wait_total", "wait_max", "run_total", "run_max", "errors")
+
+    def __init__(self):
+        self.calls = 0
+        self.wait_total = self.wait_max = 0.0
+        self.run_total = self.run_max = 0.0
+        self.errors = 0
+
+    def as_dict(self) -> Dict[str, Any]:
+        calls = self.calls or 1
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "wait_avg_ms": round(self.wait_total / calls * 1000, 3),
+            "wait_max_ms": round(self.wait_max * 1000, 3),
+            "run_avg_ms": round(self.run_total / calls * 1000, 3),
+            "run_max_ms": round(self.run_max * 1000, 3),
+        }
+
+class DBExecutor:
+    def __init__(self, name: str, workers: int, max_queue: int):
+        self.name = name
+        self.workers = max(1, workers)
+        self.max_queue = max(0, max_queue)
+        self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix=f"db-{name}")
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._running = 0
+        self._rejected = 0
+        self._stats: Dict[str, _QueryStats] = {}
+
+    async def run(self, fn: Callable, *args, label: str = "", force: bool = False) -> Any:
+        """Run ``fn(*args)`` on this executor; raise DBExecutorSaturated if full.
+
+        ``force`` skips the bound, for calls that must run once work is
+        under way (ending a transaction that holds the writer).
+        """
+        with self._lock:
+            if not force and self._pending >= self.workers + self.max_queue:
+                self._rejected += 1
+                raise DBExecutorSaturated(
+                    f"DB executor '{self.name}' saturated: {self._pending} calls pending "
+                    f"({self.workers} workers, queue {self.max_queue})"
+                )
+            self._pending += 1
+        label = " ".join(label.split())[:120]
+        enqueued = time.perf_counter()
+
+        def _task():
+            started = time.perf_counter()
+            with self._lock:
+                self._running += 1
+            failed = False
+            try:
+                return fn(*args)
+            except BaseException:
+                failed = True
+                raise
+            finally:
+                finished = time.perf_counter()
+                with self._lock:
+                    self._running -= 1
+                    self._pending -= 1
+                    self._record(label, started - enqueued, finished - started, failed)
+
+        def _cancelled(cf):
+            # A call cancelled before it started never reaches _task's bookkeeping
+            if cf.cancelled():
+                with self._lock:
+                    self._pending -= 1
+
+        try:
+            cf = self._pool.submit(_task)
+        except BaseException:
+            with self._lock:
+                self._pending -= 1
+            raise
+        cf.add_done_callback(_cancelled)
+        return await asyncio.wrap_future(cf)
+
+    def _record(self, label: str, wait: float, run: float, failed: bool):
+        s = self._stats.get(label)
+        if s is None:
+            s = self._stats[label] = _QueryStats()
+        s.calls += 1
+        s.errors += failed
+        s.wait_total += wait
+        s.run_total += run
+        if wait > s.wait_max:
+            s.wait_max = wait
+        if run > s.run_max:
+            s.run_max = run
+
+    def metrics(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "max_queue": self.max_queue,
+                "running": self._running,
+                "queue_depth": self._pending - self._running,
+                "rejected": self._rejected,
+                "queries": {label: s.as_dict() for label, s in self._stats.items()},
+            }
+
+    def shutdown(self):
+        self._pool.shutdown(wait=True)
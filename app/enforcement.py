@@ -1,85 +1,258 @@
 # app/enforcement.py - SIMPLE WORKING VERSION
-import asyncio, uuid, json
-from typing import Dict, Any, Tuple
-from app.db import get_pool
+import asyncio, uuid
+from typing import Any, Dict, FrozenSet, Optional, Sequence, Tuple
+from app.catalog import node_catalog
+from app.db import access_schema, get_pool, is_missing_conflict_target
+from app.db_executor import DBExecutorSaturated
+from app.entitlements import (
+    entitlement_bits, entitlement_cache, entitlements_changed, fetch_user_grants, sync_entitlements,
+)
 from app.logger import logger
+from app.policy_compiler import INPUT_PREREQUISITES, compile_policy
 
-async def has_access(user_id: str, node_code: str) -> Tuple[bool, str, Dict[str, Any]]:
-    """Simple access check - always return basic access for demo"""
+MAX_BATCH_CODES = 500
+
+async def approved_node_ids(user_id: str) -> FrozenSet[str]:
+    """Ids of every node the user holds an approved, unexpired grant on, plus held milestone keys (LRU-cached per user)."""
+    cached = entitlement_cache.get(user_id)
+    if cached is not None:
+        return cached
+    epoch = entitlement_cache.epoch
+    node_ids = await fetch_user_grants(user_id)
+    entitlement_cache.put(user_id, node_ids, epoch)
+    return node_ids
+
+async def granted_bits(user_id: str) -> int:
+    """The user's entitlements as a catalog bitset: from the bitset store, else via the query path."""
+    await entitlement_bits.check()
+    bits = entitlement_bits.get(user_id)
+    if bits is None:
+        bits = node_catalog.bits_for(await approved_node_ids(user_id))
+    return bits
+
+async def has_access_many(user_id: str, node_codes: Optional[Sequence[str]] = None) -> Dict[str, Tuple[bool, str, Dict[str, Any]]]:
+    """Access decisions for many nodes (all when node_codes is None).
+
+    Nodes come from the in-process catalog; the only query is the user's grants.
+    A grant the user holds always stands; otherwise a node whose ``requires``
+    chain the user has not reached is denied before its policy is consulted;
+    the graph is only walked when a requested node has such a chain.
+    """
+    codes = None if node_codes is None else list(dict.fromkeys(node_codes))
     try:
-        db = get_pool()
-        node = await db.fetchrow("SELECT id, code, label, tier, policy FROM nodes WHERE code=?", node_code)
-        
-        if not node:
-            return False, "node_not_found", {}
-            
-        # For demo purposes - simple logic
-        policy = json.loads(node["policy"]) if node.get("policy") else {}
-        
-        # Check if user already has access
-        access = await db.fetchrow(
-            "SELECT * FROM user_node_access WHERE user_id=? AND node_id=? AND status='approved'", 
-            user_id, node["id"]
-        )
-        
-        if access:
-            return True, "already_approved", {}
-            
-        # Simple policy check
-        if policy.get("open"):
-            return True, "open_access", {}
-        elif policy.get("payment"):
-            return False, "requires_payment", {"tier": node["tier"]}
-        else:
-            return False, "requires_approval", {"policy": policy}
-            
+        catalog = await node_catalog.current()
+        granted = await granted_bits(user_id)
+    except DBExecutorSaturated:
+        raise  # surfaced as 503 + Retry-After by main.py
     except Exception as e:
         logger.error(f"Access check error: {e}")
-        return False, "error", {"error": str(e)}
+        return {code: (False, "error", {"error": str(e)}) for code in codes or ()}
+    if codes is None:
+        nodes = catalog.nodes
+    else:
+        nodes = [catalog.by_code[c] for c in codes if c in catalog.by_code]
+    if any(INPUT_PREREQUISITES in n["rule"].inputs for n in nodes):
+        blocked = catalog.graph.blocked(granted)
+    else:
+        blocked = {}
+    results = {}
+    for n in nodes:
+        if granted & n["bit"]:
+            results[n["code"]] = n["rule"].evaluate(True)
+            continue
+        missing = blocked.get(n["id"])
+        if missing is not None:
+            results[n["code"]] = (False, "requires_prerequisites", {"missing": list(missing)})
+        else:
+            results[n["code"]] = n["rule"].evaluate(False)
+    for code in codes or ():
+        results.setdefault(code, (False, "node_not_found", {}))
+    return results
+
+async def has_access(user_id: str, node_code: str) -> Tuple[bool, str, Dict[str, Any]]:
+    """Access decision for one node."""
+    return (await has_access_many(user_id, [node_code]))[node_code]
+
+async def has_any_in_tier(user_id: str, tier: int) -> bool:
+    """Whether the user holds a grant on any node of ``tier`` (one AND against the tier mask)."""
+    catalog = await node_catalog.current()
+    return bool(await granted_bits(user_id) & catalog.tier_masks.get(tier, 0))
+
+# (user_id, node_code) -> the request currently being written for it
+_inflight_requests: Dict[Tuple[str, str], "asyncio.Future"] = {}
+# cleared once the upsert finds no idx_access_open_request to conflict on
+_open_request_upsert = True
 
 async def request_access(user_id: str, node_code: str, evidence: Dict[str, Any]) -> Dict[str, Any]:
-    """Simple access request"""
+    """Open an access request, or return the user's open request for the node.
+
+    Concurrent calls for the same (user, node) in this process share one
+    database write. Across processes the partial unique index on open
+    requests (migrations/0006) makes the insert an upsert, which returns the
+    existing row's id, so repeats never pile up duplicate rows. A database
+    without that index falls back to look-up-then-insert, which is only
+    coalesced within this process.
+    """
+    key = (user_id, node_code)
+    pending = _inflight_requests.get(key)
+    if pending is None:
+        pending = asyncio.ensure_future(_open_request(user_id, node_code))
+        _inflight_requests[key] = pending
+        pending.add_done_callback(lambda _: _inflight_requests.pop(key, None))
+        return await asyncio.shield(pending)
+    result = await asyncio.shield(pending)
+    return {**result, "coalesced": True} if "access_id" in result else result
+
+async def _open_request(user_id: str, node_code: str) -> Dict[str, Any]:
     try:
         db = get_pool()
-        node = await db.fetchrow("SELECT id FROM nodes WHERE code=?", node_code)
+        node = (await node_catalog.current()).by_code.get(node_code)
         
         if not node:
             return {"error": "node_not_found"}
             
-        access_id = str(uuid.uuid4())
+        new_id = str(uuid.uuid4())
+        access_id = await _upsert_open_request(db, new_id, user_id, node["id"])
         
-        await db.execute("""
-            INSERT INTO user_node_access (id, user_id, node_id, status, source, unlocked, created_at)
-            VALUES (?, ?, ?, 'requested', 'user_request', 0, datetime('now'))
-        """, access_id, user_id, node["id"])
-        
-        logger.info(f"Access request {access_id} by {user_id} for {node_code}")
-        return {"status": "requested", "access_id": access_id}
+        coalesced = access_id != new_id
+        if not coalesced:
+            logger.info(f"Access request {access_id} by {user_id} for {node_code}")
+        return {"status": "requested", "access_id": access_id, "coalesced": coalesced}
         
+    except DBExecutorSaturated:
+        raise
     except Exception as e:
         logger.error(f"Request access error: {e}")
         return {"error": str(e)}
 
+async def _upsert_open_request(db, new_id: str, user_id: str, node_id: str) -> str:
+    global _open_request_upsert
+    if _open_request_upsert:
+        try:
+            # One statement, so it rides the group-commit writer with other requests
+            rows = await db.execute_returning("""
+                INSERT INTO user_node_access (id, user_id, node_id, status, source, unlocked, created_at)
+                VALUES (?, ?, ?, 'requested', 'user_request', 0, datetime('now'))
+                ON CONFLICT (user_id, node_id) WHERE status = 'requested'
+                DO UPDATE SET updated_at = datetime('now')
+                RETURNING id
+            """, new_id, user_id, node_id)
+            return rows[0]["id"]
+        except Exception as e:
+            if not is_missing_conflict_target(e):
+                raise
+            _open_request_upsert = False
+            logger.warning(f"No unique index on open requests (migrations/0006), looking them up first: {e}")
+    existing = await db.fetchval("""
+        SELECT id FROM user_node_access WHERE user_id = ? AND node_id = ? AND status = 'requested'
+    """, user_id, node_id)
+    if existing:
+        return existing
+    await db.execute("""
+        INSERT INTO user_node_access (id, user_id, node_id, status, source, unlocked, created_at)
+        VALUES (?, ?, ?, 'requested', 'user_request', 0, datetime('now'))
+    """, new_id, user_id, node_id)
+    return new_id
+
+DECISIONS = ("approved", "rejected")
+
 async def approve_access(access_id: str, approver_id: str, role: str, decision: str = "approved", comment: str = "") -> Dict[str, Any]:
-    """Simple approval"""
+    """Record one approver's vote and unlock once the node's multisig quorum is met.
+
+    Each approver has one vote per request (re-voting replaces it). The
+    per-role tally is adjusted by the vote's delta, so the quorum check reads
+    a handful of tally rows however many approvals the request has. Only an
+    approving vote on a still-open request checks quorum; the status flips
+    from requested to approved in the same transaction, at most once, and
+    ``transition`` is True only for the vote that did it. Votes on closed
+    requests (approved, expired, revoked, ...) are refused.
+    """
+    if decision not in DECISIONS:
+        return {"error": "invalid_decision"}
     try:
         db = get_pool()
+        catalog = await node_catalog.current()
+        tallied = (await access_schema.probe())["user_node_approval_tallies"]
         
-        # Find access record
-        access = await db.fetchrow("SELECT * FROM user_node_access WHERE id=?", access_id)
-        if not access:
-            return {"error": "access_not_found"}
-            
-        # Update to approved
-        await db.execute("""
-            UPDATE user_node_access 
-            SET status = 'approved', unlocked = 1, updated_at = datetime('now')
-            WHERE id = ?
-        """, access_id)
+        async with db.transaction() as tx:
+            # Find access record (with node code for notifications)
+            access = await tx.fetchrow("""
+                SELECT a.id, a.user_id, a.node_id, a.status, n.code AS node_code
+                FROM user_node_access a
+                JOIN nodes n ON n.id = a.node_id
+                WHERE a.id = ?
+            """, access_id)
+            if not access:
+                return {"error": "access_not_found"}
+            if access["status"] != "requested":
+                return {"error": "request_closed", "status": access["status"]}
+            node = catalog.by_id.get(access["node_id"])
+            rule = node["rule"] if node else compile_policy({})
+            if not rule.role_permitted(role):
+                return {"error": "role_not_permitted", "roles": list(rule.roles)}
+
+            # One vote per approver: back out the previous vote before counting this one
+            previous = await tx.fetchrow("""
+                SELECT role, decision FROM user_node_approvals WHERE access_id = ? AND approver_id = ?
+            """, access_id, approver_id)
+            await tx.execute("""
+                INSERT INTO user_node_approvals (id, access_id, approver_id, role, decision, comment)
+                VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT (access_id, approver_id) DO UPDATE SET
+                  role = excluded.role, decision = excluded.decision, comment = excluded.comment,
+                  created_at = CURRENT_TIMESTAMP
+            """, str(uuid.uuid4()), access_id, approver_id, role, decision, comment)
+            deltas = {}
+            if previous:
+                d = deltas.setdefault(previous["role"], [0, 0])
+                d[0 if previous["decision"] == "approved" else 1] -= 1
+            d = deltas.setdefault(role, [0, 0])
+            d[0 if decision == "approved" else 1] += 1
+            if tallied:
+                await tx.executemany("""
+                    INSERT INTO user_node_approval_tallies (access_id, role, approvals, rejections)
+                    VALUES (?, ?, ?, ?)
+                    ON CONFLICT (access_id, role) DO UPDATE SET
+                      approvals = user_node_approval_tallies.approvals + excluded.approvals,
+                      rejections = user_node_approval_tallies.rejections + excluded.rejections
+                """, [(access_id, r, a, rj) for r, (a, rj) in deltas.items() if a or rj])
+                tally = await tx.fetch("""
+                    SELECT role, approvals, rejections FROM user_node_approval_tallies WHERE access_id = ?
+                """, access_id)
+            else:
+                # No tally table (see app.db.access_schema): count the votes themselves
+                tally = await tx.fetch("""
+                    SELECT role, SUM(CASE WHEN decision = 'approved' THEN 1 ELSE 0 END) AS approvals,
+                           SUM(CASE WHEN decision = 'rejected' THEN 1 ELSE 0 END) AS rejections
+                    FROM user_node_approvals WHERE access_id = ? GROUP BY role
+                """, access_id)
+            by_role = {t["role"]: t["approvals"] for t in tally}
+            transition = False
+            span = None
+            if decision == "approved" and rule.quorum_reached(by_role):
+                # Conditional on the request still being open, so concurrent final votes unlock once
+                flipped = await tx.fetch("""
+                    UPDATE user_node_access
+                    SET status = 'approved', unlocked = 1, updated_at = datetime('now')
+                    WHERE id = ? AND status = 'requested'
+                    RETURNING id
+                """, access_id)
+                transition = bool(flipped)
+                if transition:
+                    span = await sync_entitlements(tx, [(access["user_id"], access["node_id"])])
+        if transition:
+            await entitlements_changed([access["user_id"]], span)
+            logger.info(f"Approved access_id {access_id} (quorum reached)")
         
-        logger.info(f"Approved access_id {access_id}")
-        return {"status": "approved", "access_id": access_id}
+        return {"status": "approved" if transition else "pending", "transition": transition, "access_id": access_id,
+                "user_id": access["user_id"], "node_code": access["node_code"],
+                "tally": {"approvals": sum(by_role.values()), "required": rule.required_approvals,
+                          "rejections": sum(t["rejections"] for t in tally),
+                          "by_role": {t["role"]: {"approvals": t["approvals"], "rejections": t["rejections"]}
+                                      for t in tally}}}
         
+    except DBExecutorSaturated:
+        raise
     except Exception as e:
         logger.error(f"Approve access error: {e}")
-        return {"error": str(e)}
\ No newline at end of file
+        return {"error": str(e)}
@@ -0,0 +1,502 @@
+# app/entitlements.py
+"""Per-user entitlements: materialized table, bitset store and LRU fallback.
+
+``user_entitlements`` (migrations/0004) holds one row per (user, node) with
+the effective unlocked state, source and expiry derived from the
+user_node_access history. Every grant/revoke calls ``sync_entitlements``
+inside its own transaction; ``rebuild_entitlements`` (``python -m
+app.entitlements rebuild``) regenerates the table from history in one
+statement. All entitlement reads go to this narrow table. A database
+without it (a Postgres schema maintained outside migrations/; see
+app.db.access_schema) reads approved grants from user_node_access instead,
+and milestones only when user_milestones exists.
+
+``EntitlementBitsets`` (default) holds every user's approved, unexpired
+grants and held milestones (app/prerequisites) as one int, bit i set for
+the catalog node or milestone with index i. It is
+built in bulk from user_entitlements at startup (one streaming pass) and
+refreshed per user after every grant or revoke, so an access check is a
+dict lookup and an AND. Set SOVEREIGN_ENTITLEMENT_BITSETS=0 to skip the
+bulk build (e.g. very large user tables) and use the LRU below instead; a
+user whose refresh failed also falls back to it until the next refresh.
+
+Writes made elsewhere (another worker or replica, the rebuild command,
+manual SQL) are caught through the ``user_entitlements`` version row
+(migrations/0008; triggers bump it on every change). At most once every
+SOVEREIGN_ENTITLEMENT_CHECK_MS an access check reads that row.
+``sync_entitlements`` reports the version span of this process's own
+writes; a move those spans still do not account for at the next check
+clears the LRU and reloads the bitsets in the background. Without a
+version row both are rebuilt every SOVEREIGN_ENTITLEMENT_TTL_S instead.
+
+``EntitlementCache`` maps user_id -> frozenset of node ids the user holds an approved grant on
+(plus milestone keys),
+so repeat access checks are a dict lookup. Entries expire after a TTL and
+are evicted least-recently-used once either the user count or the
+estimated memory footprint passes its cap.
+
+Correctness after grants and revokes comes from explicit invalidation:
+every code path that changes a user's approved rows calls ``invalidate``
+after its transaction commits. A load that was already in flight when an
+invalidation happened is not stored (``epoch`` check), so a stale read can
+never repopulate the cache.
+"""
+import asyncio
+import os
+import sys
+import time
+from collections import OrderedDict
+from typing import Any, Dict, FrozenSet, Iterable, Optional, Set, Tuple
+from app.catalog import node_catalog
+from app.db import access_schema, get_pool, is_missing_table
+from app.logger import logger
+from app.prerequisites import milestone_key, milestone_name
+
+ENTITLEMENT_TTL_S = float(os.getenv("SOVEREIGN_ENTITLEMENT_TTL_S", "300"))
+ENTITLEMENT_MAX_USERS = int(os.getenv("SOVEREIGN_ENTITLEMENT_MAX_USERS", "50000"))
+ENTITLEMENT_MAX_MB = float(os.getenv("SOVEREIGN_ENTITLEMENT_MAX_MB", "64"))
+ENTITLEMENT_BITSETS = os.getenv("SOVEREIGN_ENTITLEMENT_BITSETS", "1") == "1"
+ENTITLEMENT_CHECK_MS = float(os.getenv("SOVEREIGN_ENTITLEMENT_CHECK_MS", "1000"))
+
+VERSION_QUERY = "SELECT version FROM catalog_version WHERE name = 'user_entitlements'"
+# Runs first in a writing transaction: locks the row, so the span that follows is ours alone
+_CLAIM_VERSION_SQL = """
+    UPDATE catalog_version SET version = version + 1 WHERE name = 'user_entitlements' RETURNING version
+"""
+
+GRANTS_QUERY = """
+    SELECT user_id, node_id FROM user_entitlements
+    WHERE unlocked = 1 AND (expires_at IS NULL OR expires_at > datetime('now'))
+"""
+USER_GRANTS_QUERY = """
+    SELECT node_id FROM user_entitlements
+    WHERE user_id = ? AND unlocked = 1 AND (expires_at IS NULL OR expires_at > datetime('now'))
+"""
+# Without user_entitlements (a Postgres schema managed outside migrations/), grants come from the history
+HISTORY_GRANTS_QUERY = """
+    SELECT DISTINCT user_id, node_id FROM user_node_access
+    WHERE status = 'approved' AND (expires_at IS NULL OR expires_at > datetime('now'))
+    -- plan: full-scan-ok (bulk load fallback)
+"""
+USER_HISTORY_GRANTS_QUERY = """
+    SELECT DISTINCT node_id FROM user_node_access
+    WHERE user_id = ? AND status = 'approved' AND (expires_at IS NULL OR expires_at > datetime('now'))
+"""
+# Held milestones (migrations/0009) take catalog bits under milestone_key()
+MILESTONES_QUERY = "SELECT user_id, name FROM user_milestones"
+USER_MILESTONES_QUERY = "SELECT name FROM user_milestones WHERE user_id = ?"
+
+# The effective row for a (user, node): an approved grant wins, unexpiring before
+# expiring, latest expiry first; with no approved grant, the latest revocation.
+# Both statements (and the migration backfill) must rank rows the same way.
+SYNC_ENTITLEMENT_SQL = """
+    INSERT INTO user_entitlements (user_id, node_id, unlocked, source, access_id, expires_at, updated_at)
+    SELECT user_id, node_id, CASE WHEN status = 'approved' THEN 1 ELSE 0 END, source, id, expires_at, datetime('now')
+    FROM user_node_access
+    WHERE user_id = ? AND node_id = ? AND status IN ('approved', 'expired', 'revoked')
+    ORDER BY CASE WHEN status = 'approved' THEN 0 ELSE 1 END,
+             CASE WHEN expires_at IS NULL THEN 0 ELSE 1 END,
+             expires_at DESC, updated_at DESC
+    LIMIT 1
+    ON CONFLICT (user_id, node_id) DO UPDATE SET
+      unlocked = excluded.unlocked, source = excluded.source, access_id = excluded.access_id,
+      expires_at = excluded.expires_at, updated_at = excluded.updated_at
+"""
+REBUILD_SQL = """
+    INSERT INTO user_entitlements (user_id, node_id, unlocked, source, access_id, expires_at, updated_at)
+    SELECT user_id, node_id, unlocked, source, id, expires_at, datetime('now') FROM (
+      SELECT user_id, node_id, id, source, expires_at,
+             CASE WHEN status = 'approved' THEN 1 ELSE 0 END AS unlocked,
+             ROW_NUMBER() OVER (
+               PARTITION BY user_id, node_id
+               ORDER BY CASE WHEN status = 'approved' THEN 0 ELSE 1 END,
+                        CASE WHEN expires_at IS NULL THEN 0 ELSE 1 END,
+                        expires_at DESC, updated_at DESC
+             ) AS pick
+      FROM user_node_access
+      WHERE status IN ('approved', 'expired', 'revoked')
+    ) ranked
+    WHERE pick = 1
+"""
+
+async def fetch_user_grants(user_id: str) -> FrozenSet[str]:
+    """Node ids of the user's approved, unexpired grants plus their milestone keys."""
+    tables = await access_schema.probe()
+    db = get_pool()
+    query = USER_GRANTS_QUERY if tables["user_entitlements"] else USER_HISTORY_GRANTS_QUERY
+    keys = {r["node_id"] for r in await db.fetch(query, user_id)}
+    if tables["user_milestones"]:
+        keys.update(milestone_key(r["name"]) for r in await db.fetch(USER_MILESTONES_QUERY, user_id))
+    return frozenset(keys)
+
+async def _iterate_grants():
+    """(user_id, node id or milestone key) for every user, streamed."""
+    tables = await access_schema.probe()
+    db = get_pool()
+    async for r in db.iterate(GRANTS_QUERY if tables["user_entitlements"] else HISTORY_GRANTS_QUERY):
+        yield r["user_id"], r["node_id"]
+    if tables["user_milestones"]:
+        async for r in db.iterate(MILESTONES_QUERY):
+            yield r["user_id"], milestone_key(r["name"])
+
+_ENTRY_OVERHEAD = 160  # OrderedDict slot + tuple + float, roughly
+
+def _entry_size(user_id: str, node_ids: FrozenSet[str]) -> int:
+    return (_ENTRY_OVERHEAD + sys.getsizeof(user_id) + sys.getsizeof(node_ids)
+            + sum(sys.getsizeof(n) for n in node_ids))
+
+class EntitlementCache:
+    """LRU + TTL cache; used only from the event loop, so it needs no lock."""
+
+    def __init__(self, ttl_s: float = ENTITLEMENT_TTL_S, max_users: int = ENTITLEMENT_MAX_USERS,
+                 max_mb: float = ENTITLEMENT_MAX_MB):
+        self.ttl_s = ttl_s
+        self.max_users = max(1, max_users)
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self._entries: "OrderedDict[str, Tuple[float, FrozenSet[str], int]]" = OrderedDict()
+        self._bytes = 0
+        self.epoch = 0
+        self.hits = self.misses = self.evictions = self.expirations = self.invalidations = 0
+        self.stale_loads = 0
+
+    def get(self, user_id: str) -> Optional[FrozenSet[str]]:
+        entry = self._entries.get(user_id)
+        if entry is None:
+            self.misses += 1
+            return None
+        expires, node_ids, _ = entry
+        if time.monotonic() >= expires:
+            self._drop(user_id)
+            self.expirations += 1
+            self.misses += 1
+            return None
+        self._entries.move_to_end(user_id)
+        self.hits += 1
+        return node_ids
+
+    def put(self, user_id: str, node_ids: FrozenSet[str], epoch: int):
+        """Store a load that started at ``epoch``; dropped if anything was invalidated since."""
+        if epoch != self.epoch:
+            self.stale_loads += 1
+            return
+        if user_id in self._entries:
+            self._drop(user_id)
+        size = _entry_size(user_id, node_ids)
+        self._entries[user_id] = (time.monotonic() + self.ttl_s, node_ids, size)
+        self._bytes += size
+        while self._entries and (len(self._entries) > self.max_users or self._bytes > self.max_bytes):
+            oldest = next(iter(self._entries))
+            self._drop(oldest)
+            self.evictions += 1
+
+    def invalidate(self, user_ids: Iterable[str]):
+        """Forget the given users; call after the transaction that changed their grants commits."""
+        self.epoch += 1
+        for user_id in user_ids:
+            self.invalidations += 1
+            if user_id in self._entries:
+                self._drop(user_id)
+
+    def clear(self):
+        self.epoch += 1
+        self._entries.clear()
+        self._bytes = 0
+
+    def _drop(self, user_id: str):
+        _, _, size = self._entries.pop(user_id)
+        self._bytes -= size
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "users": len(self._entries),
+            "bytes": self._bytes,
+            "max_users": self.max_users,
+            "max_bytes": self.max_bytes,
+            "ttl_s": self.ttl_s,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else None,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "invalidations": self.invalidations,
+            "stale_loads": self.stale_loads,
+        }
+
+entitlement_cache = EntitlementCache()
+
+class EntitlementBitsets:
+    """user_id -> int bitset of catalog node bits; users with no grants are absent.
+
+    Also tracks which ``user_entitlements`` version the in-memory stores
+    (this and the LRU) reflect; see the module docstring.
+    """
+
+    def __init__(self, enabled: bool = ENTITLEMENT_BITSETS, check_ms: float = ENTITLEMENT_CHECK_MS,
+                 ttl_s: float = ENTITLEMENT_TTL_S):
+        self.enabled = enabled
+        self.check_interval = max(0.0, check_ms) / 1000.0
+        self.ttl_s = ttl_s
+        self.loaded = False
+        self._bits: Dict[str, int] = {}
+        self._stale: Set[str] = set()
+        self._refreshing: Dict[str, int] = {}
+        self._seq = 0
+        self._touched: Optional[Set[str]] = None  # users refreshed while a load streams
+        self.version: Optional[int] = None
+        self._versioned = True
+        self._spans: Dict[int, int] = {}  # local commits not yet chained: start version -> end version
+        self._unexplained: Optional[int] = None
+        self._next_check = 0.0
+        self._synced_at = time.monotonic()
+        self._reload: Optional[asyncio.Task] = None
+        self._load_lock = asyncio.Lock()
+        self.grants_loaded = 0
+        self.load_seconds: Optional[float] = None
+        self.refreshes = self.refresh_failures = 0
+        self.reloads = self.reload_failures = 0
+
+    async def _read_version(self) -> Optional[int]:
+        if not self._versioned:
+            return None
+        try:
+            version = await get_pool().fetchval(VERSION_QUERY)
+        except Exception as e:
+            if not is_missing_table(e):
+                raise
+            version = None
+        if version is None:
+            # No version row (e.g. a Postgres schema without migration 0008)
+            self._versioned = False
+            logger.warning(f"[Entitlements] No user_entitlements version row; reloading every {self.ttl_s:g}s")
+        return version
+
+    async def load(self):
+        """Bulk build from the access table in one streaming pass."""
+        async with self._load_lock:
+            await self._load()
+
+    async def _load(self):
+        version = await self._read_version()
+        self._synced_at = time.monotonic()
+        if not self.enabled:
+            self._set_version(version)
+            return
+        started = time.perf_counter()
+        bits: Dict[str, int] = {}
+        grants = 0
+        bit_for = node_catalog.bit_for
+        self._touched = set()
+        try:
+            async for user_id, key in _iterate_grants():
+                bits[user_id] = bits.get(user_id, 0) | bit_for(key)
+                grants += 1
+        finally:
+            touched, self._touched = self._touched, None
+        self._bits, self._stale, self.loaded = bits, set(), True
+        self._set_version(version)
+        self.grants_loaded = grants
+        self.load_seconds = round(time.perf_counter() - started, 3)
+        logger.info(f"[Entitlements] Loaded {grants} grants for {len(bits)} users in {self.load_seconds}s")
+        if touched:
+            await self.refresh(touched)  # changed while the pass streamed, which may predate them
+
+    def get(self, user_id: str) -> Optional[int]:
+        """The user's bitset, or None when the store cannot answer for them."""
+        if not self.loaded or user_id in self._stale:
+            return None
+        return self._bits.get(user_id, 0)
+
+    async def refresh(self, user_ids: Iterable[str]):
+        """Re-read the users' grants; only the latest refresh started for a user is applied."""
+        if self._touched is not None:
+            user_ids = list(user_ids)
+            self._touched.update(user_ids)
+        if not self.loaded:
+            return
+        for user_id in user_ids:
+            self._seq += 1
+            seq = self._refreshing[user_id] = self._seq
+            try:
+                keys = await fetch_user_grants(user_id)
+            except Exception as e:
+                if self._refreshing.get(user_id) == seq:
+                    del self._refreshing[user_id]
+                    self._stale.add(user_id)
+                self.refresh_failures += 1
+                logger.error(f"[Entitlements] Refresh failed for {user_id}, falling back to queries: {e}")
+                continue
+            if self._refreshing.get(user_id) != seq:
+                continue  # a later refresh for this user owns the result
+            del self._refreshing[user_id]
+            mask = node_catalog.bits_for(keys)
+            if mask:
+                self._bits[user_id] = mask
+            else:
+                self._bits.pop(user_id, None)
+            self._stale.discard(user_id)
+            self.refreshes += 1
+
+    def _set_version(self, version: Optional[int]):
+        self.version = version
+        self._unexplained = None
+        if version is None:
+            self._spans.clear()
+            return
+        self._spans = {start: end for start, end in self._spans.items() if start >= version}
+        self._advance()
+
+    def _advance(self):
+        while self.version in self._spans:
+            self.version = self._spans.pop(self.version)
+
+    def observed(self, span: Optional[Tuple[int, int]]):
+        """Account for a committed local write (see sync_entitlements) once its users are refreshed."""
+        if span is None or self.version is None or span[1] <= self.version:
+            return
+        self._spans[span[0]] = span[1]
+        self._advance()
+
+    async def check(self):
+        """Pick up changes made outside this process; cheap enough to call on every access check."""
+        now = time.monotonic()
+        if now < self._next_check:
+            return
+        self._next_check = now + self.check_interval
+        version = None
+        if self._versioned:
+            try:
+                version = await self._read_version()
+            except Exception as e:
+                logger.warning(f"[Entitlements] Version check failed, retrying next check: {e}")
+                return
+        if self._versioned:
+            if self.version is not None and version <= self.version:
+                self._unexplained = None
+                return
+            if self.version is not None and (self._unexplained is None or self.version >= self._unexplained):
+                # our own commits may not have reached observed() yet: give them one interval
+                self._unexplained = version
+                return
+        elif now - self._synced_at < self.ttl_s:
+            return
+        entitlement_cache.clear()
+        self._synced_at = now
+        if self.enabled and self.loaded:
+            if self._reload is None:
+                self._reload = asyncio.ensure_future(self._run_reload())
+        else:
+            self._set_version(version)
+        logger.info(f"[Entitlements] Outside changes (version {version}): cache cleared, bitsets reloading")
+
+    async def _run_reload(self):
+        try:
+            await self.load()
+            self.reloads += 1
+        except Exception as e:
+            self.reload_failures += 1
+            self._next_check = 0.0
+            logger.error(f"[Entitlements] Reload failed, keeping the current bitsets: {e}")
+        finally:
+            self._reload = None
+
+    async def stop(self):
+        """Cancel a background reload (shutdown)."""
+        if self._reload is not None:
+            self._reload.cancel()
+            try:
+                await self._reload
+            except asyncio.CancelledError:
+                pass
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "loaded": self.loaded,
+            "users": len(self._bits),
+            "grants_loaded": self.grants_loaded,
+            "load_seconds": self.load_seconds,
+            "stale_users": len(self._stale),
+            "refreshes": self.refreshes,
+            "refresh_failures": self.refresh_failures,
+            "version": self.version,
+            "versioned": self._versioned,
+            "reloads": self.reloads,
+            "reload_failures": self.reload_failures,
+        }
+
+entitlement_bits = EntitlementBitsets()
+
+async def entitlements_changed(user_ids: Iterable[str], span: Optional[Tuple[int, int]] = None):
+    """Call after a transaction that granted or revoked access commits, with its sync_entitlements span."""
+    user_ids = set(user_ids)
+    entitlement_cache.invalidate(user_ids)
+    await entitlement_bits.refresh(user_ids)
+    entitlement_bits.observed(span)
+
+async def sync_entitlements(tx, pairs: Iterable[Tuple[str, str]]) -> Optional[Tuple[int, int]]:
+    """Re-derive user_entitlements rows for (user_id, node_id) pairs inside the writing transaction.
+
+    Returns the (before, after) version span of the write, for entitlements_changed.
+    Without the table (see app.db.access_schema) reads go to the history and there is nothing to sync.
+    """
+    pairs = list(dict.fromkeys(pairs))
+    tables = await access_schema.probe()
+    if not pairs or not tables["user_entitlements"]:
+        return None
+    claimed = await tx.fetchval(_CLAIM_VERSION_SQL) if tables["catalog_version"] else None
+    await tx.executemany(SYNC_ENTITLEMENT_SQL, pairs)
+    if claimed is None:
+        return None
+    return claimed - 1, await tx.fetchval(VERSION_QUERY)
+
+async def set_milestone(user_id: str, name: str, held: bool = True, source: str = "admin") -> Dict[str, Any]:
+    """Record (or withdraw) a user milestone; nodes whose ``requires`` name it re-evaluate on the next check."""
+    name = milestone_name(name)
+    tables = await access_schema.probe()
+    if not tables["user_milestones"]:
+        return {"error": "milestones_unavailable"}
+    async with get_pool().transaction() as tx:
+        claimed = await tx.fetchval(_CLAIM_VERSION_SQL) if tables["catalog_version"] else None
+        if held:
+            await tx.execute("""
+                INSERT INTO user_milestones (user_id, name, source, created_at)
+                VALUES (?, ?, ?, datetime('now'))
+                ON CONFLICT (user_id, name) DO NOTHING
+            """, user_id, name, source)
+        else:
+            await tx.execute("DELETE FROM user_milestones WHERE user_id = ? AND name = ?", user_id, name)
+        span = None if claimed is None else (claimed - 1, await tx.fetchval(VERSION_QUERY))
+    await entitlements_changed([user_id], span)
+    logger.info(f"[Entitlements] Milestone {name} {'recorded' if held else 'withdrawn'} for {user_id}")
+    return {"user_id": user_id, "milestone": name, "held": held}
+
+async def rebuild_entitlements() -> Dict[str, Any]:
+    """Regenerate user_entitlements from the full history in one transaction."""
+    started = time.perf_counter()
+    async with get_pool().transaction() as tx:
+        await tx.execute("DELETE FROM user_entitlements -- plan: full-scan-ok (rebuild)")
+        await tx.execute(REBUILD_SQL)
+        rows = await tx.fetchval("SELECT COUNT(*) FROM user_entitlements")
+        unlocked = await tx.fetchval("SELECT COUNT(*) FROM user_entitlements WHERE unlocked = 1")
+    seconds = round(time.perf_counter() - started, 3)
+    logger.info(f"[Entitlements] Rebuilt {rows} rows ({unlocked} unlocked) in {seconds}s")
+    return {"rows": rows, "unlocked": unlocked, "seconds": seconds}
+
+async def _main(argv=None) -> int:
+    import argparse
+    from app.db import setup_db_pool, shutdown_db_pool
+
+    ap = argparse.ArgumentParser(description="Maintain the user_entitlements table.")
+    ap.add_argument("command", choices=["rebuild"])
+    ap.parse_args(argv)
+    await setup_db_pool()
+    try:
+        result = await rebuild_entitlements()
+    finally:
+        await shutdown_db_pool()
+    print(f"user_entitlements rebuilt: {result['rows']} rows, {result['unlocked']} unlocked, {result['seconds']}s")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(_main()))
@@ -0,0 +1,133 @@
+# app/expiry.py
+"""Background expiry of time-limited access.
+
+Every SOVEREIGN_EXPIRY_SWEEP_S seconds the sweeper expires approved grants
+whose ``expires_at`` has passed, SOVEREIGN_EXPIRY_BATCH rows per
+transaction (found through idx_access_expiry, migrations/0007), pausing
+between batches so the writer is never held for long. Each batch
+re-derives the affected user_entitlements rows in the same transaction;
+afterwards the in-memory entitlements are refreshed and each user gets an
+``access_expired`` WebSocket event.
+
+Access checks never compare timestamps: a grant stays effective in memory
+until the sweep that expires it, so the sweep interval bounds how late an
+expiry takes effect.
+"""
+import asyncio
+import os
+import time
+from typing import Any, Dict, List, Optional, Tuple
+from app.catalog import node_catalog
+from app.db import get_pool
+from app.entitlements import entitlements_changed, sync_entitlements
+from app.logger import logger
+from app.ws import manager
+
+EXPIRY_SWEEP_S = float(os.getenv("SOVEREIGN_EXPIRY_SWEEP_S", "60"))  # 0 disables the sweeper
+EXPIRY_BATCH = int(os.getenv("SOVEREIGN_EXPIRY_BATCH", "500"))
+EXPIRY_BATCH_PAUSE_MS = float(os.getenv("SOVEREIGN_EXPIRY_BATCH_PAUSE_MS", "10"))
+
+EXPIRE_BATCH_SQL = """
+    UPDATE user_node_access
+    SET status = 'expired', unlocked = 0, updated_at = datetime('now')
+    WHERE id IN (
+      SELECT id FROM user_node_access
+      WHERE status = 'approved' AND expires_at IS NOT NULL AND expires_at <= datetime('now')
+      ORDER BY expires_at
+      LIMIT ?
+    )
+    RETURNING id, user_id, node_id
+"""
+
+class ExpirySweeper:
+    def __init__(self, interval_s: float = EXPIRY_SWEEP_S, batch: int = EXPIRY_BATCH,
+                 pause_ms: float = EXPIRY_BATCH_PAUSE_MS):
+        self.interval_s = interval_s
+        self.batch = max(1, batch)
+        self.pause_s = max(0.0, pause_ms) / 1000.0
+        self._task: Optional[asyncio.Task] = None
+        self._lock = asyncio.Lock()
+        self.sweeps = 0
+        self.expired = 0
+        self.failures = 0
+        self.last_sweep: Optional[Dict[str, Any]] = None
+
+    async def sweep(self) -> Dict[str, Any]:
+        """Expire everything that is due, one bounded batch per transaction."""
+        async with self._lock:
+            started = time.perf_counter()
+            expired = batches = 0
+            while True:
+                rows, span = await self._expire_batch()
+                batches += 1
+                expired += len(rows)
+                if rows:
+                    await self._notify(rows, span)
+                if len(rows) < self.batch:
+                    break
+                await asyncio.sleep(self.pause_s)
+            self.sweeps += 1
+            self.expired += expired
+            self.last_sweep = {"expired": expired, "batches": batches,
+                               "seconds": round(time.perf_counter() - started, 3), "at": time.time()}
+            if expired:
+                logger.info(f"[Expiry] Expired {expired} grants in {batches} batches")
+            return self.last_sweep
+
+    async def _expire_batch(self) -> Tuple[List[Any], Optional[Tuple[int, int]]]:
+        async with get_pool().transaction() as tx:
+            rows = await tx.fetch(EXPIRE_BATCH_SQL, self.batch)
+            span = await sync_entitlements(tx, [(r["user_id"], r["node_id"]) for r in rows])
+        return rows, span
+
+    async def _notify(self, rows: List[Any], span: Optional[Tuple[int, int]]):
+        await entitlements_changed((r["user_id"] for r in rows), span)
+        by_id = (await node_catalog.current()).by_id
+        for r in rows:
+            node = by_id.get(r["node_id"])
+            try:
+                await manager.broadcast_to_user(r["user_id"], {
+                    "type": "access_expired",
+                    "access_id": r["id"],
+                    "node_code": node["code"] if node else None,
+                })
+            except Exception as e:
+                logger.warning(f"[Expiry] Could not notify {r['user_id']}: {e}")
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval_s)
+            try:
+                await self.sweep()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.failures += 1
+                logger.error(f"[Expiry] Sweep failed: {e}")
+
+    def start(self):
+        if self.interval_s > 0 and self._task is None:
+            self._task = asyncio.create_task(self._run())
+            logger.info(f"[Expiry] Sweeper started: every {self.interval_s:g}s, batches of {self.batch}")
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "running": self._task is not None,
+            "interval_s": self.interval_s,
+            "batch": self.batch,
+            "sweeps": self.sweeps,
+            "expired": self.expired,
+            "failures": self.failures,
+            "last_sweep": self.last_sweep,
+        }
+
+expiry_sweeper = ExpirySweeper()
@@ -1,9 +1,15 @@
 # app/main.py - UPDATED WITH PAYMENTS
 import asyncio
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect
+from fastapi import FastAPI, Request, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 from contextlib import asynccontextmanager
+from app.backup_jobs import backup_scheduler
+from app.catalog import node_catalog
+from app.entitlements import entitlement_bits
+from app.expiry import expiry_sweeper
 from app.db import setup_db_pool, shutdown_db_pool
+from app.db_executor import DBExecutorSaturated
 from app.ws import manager
 from app.admin import router as admin_router
 from app.routes import router as api_router
@@ -14,8 +20,15 @@ from app.logger import logger
 async def lifespan(app: FastAPI):
     logger.info("--- [STARTUP] ARKWELL SYSTEMS STARTING ---")
     await setup_db_pool()
+    await node_catalog.load()
+    await entitlement_bits.load()
     logger.info("--- [LIFESPAN] ARKWELL DB READY ---")
+    backup_scheduler.start()
+    expiry_sweeper.start()
     yield
+    await expiry_sweeper.stop()
+    await backup_scheduler.stop()
+    await entitlement_bits.stop()
     logger.info("--- [SHUTDOWN] CLOSING DB ---")
     await shutdown_db_pool()
 
@@ -29,6 +42,11 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.exception_handler(DBExecutorSaturated)
+async def db_saturated(request: Request, exc: DBExecutorSaturated):
+    logger.warning(f"DB saturated: {exc}")
+    return JSONResponse(status_code=503, content={"detail": str(exc)}, headers={"Retry-After": "1"})
+
 # Include all routers
 app.include_router(api_router)
 app.include_router(admin_router)
@@ -2,7 +2,9 @@
 from fastapi import APIRouter, Request, HTTPException, Header
 import stripe
 from app.stripe_config import STRIPE_WEBHOOK_SECRET, ARKWELL_PRODUCTS
+from app.catalog import node_catalog
 from app.db import get_pool
+from app.entitlements import entitlements_changed, sync_entitlements
 from app.logger import logger
 import json
 
@@ -72,17 +74,25 @@ async def handle_payment_success(session):
     
     logger.info(f"🎉 PAYMENT SUCCESS: {user_id} purchased {node_code}")
     
-    # Grant access in database
-    await db.execute("""
-        INSERT INTO user_node_access (id, user_id, node_id, status, source, unlocked, meta)
-        SELECT ?, ?, nodes.id, 'approved', 'stripe_payment', 1, ?
-        FROM nodes WHERE nodes.code = ?
-    """, (
-        f"stripe_{session['id']}",
-        user_id,
-        json.dumps({"stripe_session_id": session['id'], "subscription_id": session.get('subscription')}),
-        node_code
-    ))
+    node = (await node_catalog.current()).by_code.get(node_code)
+    if not node:
+        logger.error(f"❌ PAYMENT FOR UNKNOWN NODE: {node_code}")
+        return
+    
+    # Grant access in database (Stripe retries webhooks, so the insert is idempotent)
+    async with db.transaction() as tx:
+        await tx.execute("""
+            INSERT INTO user_node_access (id, user_id, node_id, status, source, unlocked, meta)
+            VALUES (?, ?, ?, 'approved', 'stripe_payment', 1, ?)
+            ON CONFLICT (id) DO NOTHING
+        """,
+            f"stripe_{session['id']}",
+            user_id,
+            node["id"],
+            json.dumps({"stripe_session_id": session['id'], "subscription_id": session.get('subscription')})
+        )
+        span = await sync_entitlements(tx, [(user_id, node["id"])])
+    await entitlements_changed([user_id], span)
     
     logger.info(f"✅ ACCESS GRANTED: {user_id} → {node_code}")
 
@@ -91,11 +101,17 @@ async def handle_subscription_cancelled(subscription):
     db = get_pool()
     
     # Find and revoke access
-    await db.execute("""
-        UPDATE user_node_access 
-        SET status = 'expired', unlocked = 0, updated_at = datetime('now')
-        WHERE meta LIKE ? AND status = 'approved'
-    """, f'%{subscription["id"]}%')
+    async with db.transaction() as tx:
+        revoked = await tx.fetch("""
+            UPDATE user_node_access 
+            SET status = 'expired', unlocked = 0, updated_at = datetime('now')
+            WHERE source = 'stripe_payment'
+              AND json_extract(meta, '$.subscription_id') = ?
+              AND status = 'approved'
+            RETURNING user_id, node_id
+        """, subscription["id"])
+        span = await sync_entitlements(tx, [(r["user_id"], r["node_id"]) for r in revoked])
+    await entitlements_changed((r["user_id"] for r in revoked), span)
     
     logger.info(f"🔒 ACCESS REVOKED: Subscription {subscription['id']} cancelled")
 
@@ -4,27 +4,319 @@ import json
 import uuid
 import asyncio
 import os
+import queue
+import threading
 from datetime import datetime
-from contextlib import contextmanager
-from typing import Any, Dict, List, Optional
+from contextlib import asynccontextmanager, contextmanager
+from typing import Any, AsyncIterator, Dict, List, Mapping, Optional, Tuple
+from app.db_executor import DBExecutor
 from app.logger import logger
+from app.rows import compact_rows
+from app.sql import SQLITE
 
 ROOT = os.getcwd()
 DB_PATH_DEFAULT = os.environ.get("SOVEREIGN_DB", os.path.join(ROOT, "sovereign_kingdom.db"))
 MIGRATIONS_DIR = os.path.join(ROOT, "migrations")
 
+# PRAGMA profiles applied to every pooled connection. cache_size is in KiB when
+# negative (SQLite convention), mmap_size in bytes, busy_timeout in ms. The
+# profile's synchronous only holds for readers: the writer commits with
+# WRITER_SYNCHRONOUS (FULL by default), so under WAL a write is on disk, not
+# just in the OS cache, by the time its caller resumes. Group commit spreads
+# that fsync over every statement in the batch.
+SQLITE_PROFILES: Dict[str, Dict[str, Any]] = {
+    "durable": {"synchronous": "FULL", "cache_size": -16000, "mmap_size": 0, "busy_timeout": 5000},
+    "balanced": {"synchronous": "NORMAL", "cache_size": -64000, "mmap_size": 256 * 1024 * 1024, "busy_timeout": 5000},
+    "throughput": {"synchronous": "OFF", "cache_size": -256000, "mmap_size": 1024 * 1024 * 1024, "busy_timeout": 10000},
+}
+DB_PROFILE_DEFAULT = os.environ.get("SOVEREIGN_DB_PROFILE", "balanced")
+WRITER_SYNCHRONOUS_DEFAULT = os.environ.get("SOVEREIGN_DB_WRITER_SYNCHRONOUS", "FULL")
+DB_READERS_DEFAULT = int(os.environ.get("SOVEREIGN_DB_READERS", "4"))
+# Group commit: the writer task commits up to WRITE_BATCH_SIZE statements, or
+# whatever arrived within WRITE_WINDOW_MS of the first one, in one transaction.
+WRITE_BATCH_SIZE_DEFAULT = int(os.environ.get("SOVEREIGN_WRITE_BATCH", "64"))
+WRITE_WINDOW_MS_DEFAULT = float(os.environ.get("SOVEREIGN_WRITE_WINDOW_MS", "2"))
+ITERATE_CHUNK_DEFAULT = 500
+# Dedicated executors: "hot" serves point reads, writes and commits (one worker
+# per reader plus one for the writer by default); "bulk" serves iterate() on
+# its own reader connections so long scans never occupy hot workers or readers.
+DB_WORKERS_DEFAULT = int(os.environ.get("SOVEREIGN_DB_WORKERS", "0")) or None
+DB_QUEUE_DEFAULT = int(os.environ.get("SOVEREIGN_DB_QUEUE", "256"))
+DB_BULK_WORKERS_DEFAULT = int(os.environ.get("SOVEREIGN_DB_BULK_WORKERS", "2"))
+# "dict" copies every row into a dict; "compact" returns tuple-backed
+# CompactRows (see app.rows) with lazily decoded JSON columns.
+ROW_TYPES = ("dict", "compact")
+ROW_TYPE_DEFAULT = os.environ.get("SOVEREIGN_ROW_TYPE", "dict")
+
+Row = Mapping[str, Any]
+
+def _query(conn: sqlite3.Connection, query: str, params, compact: bool) -> sqlite3.Cursor:
+    cur = conn.cursor()
+    if compact:
+        cur.row_factory = None
+    return cur.execute(query, params)
+
+def _rows(cur: sqlite3.Cursor, rows, compact: bool) -> List[Row]:
+    if compact:
+        return compact_rows(cur.description, rows)
+    return [dict(r) for r in rows]
+
+async def _settled(aw) -> Any:
+    """Await executor work to completion even if the caller is cancelled, so
+    nothing is still running on the writer when the caller moves on."""
+    fut = asyncio.ensure_future(aw)
+    try:
+        return await asyncio.shield(fut)
+    except asyncio.CancelledError:
+        await asyncio.wait({fut})
+        raise
+
+class SQLiteTransaction:
+    """Unit of work bound to the writer connection.
+
+    Mirrors the asyncpg connection API (fetch/fetchrow/fetchval/execute/
+    executemany). Each statement is one hop on the hot executor, so a busy
+    writer or a long statement never blocks the event loop. Keep bodies short:
+    the writer is held until the unit ends.
+    """
+
+    def __init__(self, conn: sqlite3.Connection, executor: DBExecutor, compact: bool = False):
+        self._conn = conn
+        self._executor = executor
+        self._compact = compact
+
+    def _run(self, fn, query: str):
+        return _settled(self._executor.run(fn, label=query))
+
+    async def fetchrow(self, query: str, *params) -> Optional[Row]:
+        def _fn():
+            cur = _query(self._conn, query, params, self._compact)
+            r = cur.fetchone()
+            return _rows(cur, [r], self._compact)[0] if r else None
+        return await self._run(_fn, query)
+
+    async def fetch(self, query: str, *params) -> List[Row]:
+        def _fn():
+            cur = _query(self._conn, query, params, self._compact)
+            return _rows(cur, cur.fetchall(), self._compact)
+        return await self._run(_fn, query)
+
+    async def fetchval(self, query: str, *params) -> Any:
+        def _fn():
+            r = self._conn.execute(query, params).fetchone()
+            return r[0] if r else None
+        return await self._run(_fn, query)
+
+    async def execute(self, query: str, *params) -> None:
+        await self._run(lambda: self._conn.execute(query, params), query)
+
+    async def executemany(self, query: str, args) -> None:
+        args = list(args)
+        await self._run(lambda: self._conn.executemany(query, args), query)
+
 class SovereignSQLite:
-    def __init__(self, db_path: str = DB_PATH_DEFAULT):
+    """SQLite backend with a long-lived WAL connection pool.
+
+    One writer connection (guarded by a lock, synchronous=``writer_synchronous``)
+    serves every write; ``readers`` query-only connections, on the profile's
+    PRAGMAs, serve reads concurrently. Connections keep their
+    statement cache for the life of the pool. Once ``start()`` has been awaited,
+    ``execute`` and ``execute_returning`` go through a single writer task that
+    group-commits batches.
+    Multi-statement units of work use ``async with db.transaction() as tx``.
+    """
+    dialect = SQLITE
+
+    def __init__(self, db_path: str = DB_PATH_DEFAULT, readers: int = DB_READERS_DEFAULT,
+                 profile: str = DB_PROFILE_DEFAULT, write_batch_size: int = WRITE_BATCH_SIZE_DEFAULT,
+                 write_window_ms: float = WRITE_WINDOW_MS_DEFAULT, row_type: str = ROW_TYPE_DEFAULT,
+                 workers: Optional[int] = DB_WORKERS_DEFAULT, max_queue: int = DB_QUEUE_DEFAULT,
+                 bulk_workers: int = DB_BULK_WORKERS_DEFAULT,
+                 writer_synchronous: str = WRITER_SYNCHRONOUS_DEFAULT, **pragmas):
+        if profile not in SQLITE_PROFILES:
+            raise ValueError(f"Unknown SQLite profile {profile!r}; expected one of {sorted(SQLITE_PROFILES)}")
+        if row_type not in ROW_TYPES:
+            raise ValueError(f"Unknown row type {row_type!r}; expected one of {ROW_TYPES}")
         self.db_path = db_path
+        self.profile = profile
+        self.pragmas = {**SQLITE_PROFILES[profile], **pragmas}
+        self.writer_synchronous = writer_synchronous
+        self.reader_count = max(1, readers)
+        self.write_batch_size = max(1, write_batch_size)
+        self.write_window = max(0.0, write_window_ms) / 1000.0
+        self.compact_rows = row_type == "compact"
+        self._write_queue: Optional[asyncio.Queue] = None
+        self._writer_task: Optional[asyncio.Task] = None
         os.makedirs(os.path.dirname(self.db_path) if os.path.dirname(self.db_path) else ".", exist_ok=True)
+        self._writer = self._connect()
+        self._writer.execute("PRAGMA journal_mode = WAL;")
+        self._writer_lock = threading.Lock()
+        # Serialises async users of the writer: group-commit batches and transactions.
+        self._write_gate = asyncio.Lock()
         self._init_and_migrate()
+        self._readers: "queue.LifoQueue[sqlite3.Connection]" = queue.LifoQueue()
+        for _ in range(self.reader_count):
+            self._readers.put(self._connect(read_only=True))
+        self._executor = DBExecutor("hot", workers or self.reader_count + 1, max_queue)
+        self._bulk_executor = DBExecutor("bulk", bulk_workers, max_queue)
+        self._bulk_readers: "queue.LifoQueue[sqlite3.Connection]" = queue.LifoQueue()
+        for _ in range(self._bulk_executor.workers):
+            self._bulk_readers.put(self._connect(read_only=True))
+        # iterate() holds a bulk reader across awaits, so it must wait for one
+        # on the loop rather than inside a bulk worker thread.
+        self._bulk_slots = asyncio.Semaphore(self._bulk_executor.workers)
 
-    def _connect(self):
-        c = sqlite3.connect(self.db_path, check_same_thread=False)
+    def _connect(self, read_only: bool = False):
+        c = sqlite3.connect(self.db_path, check_same_thread=False, cached_statements=256)
         c.row_factory = sqlite3.Row
         c.execute("PRAGMA foreign_keys = ON;")
+        for name, value in self.pragmas.items():
+            c.execute(f"PRAGMA {name} = {value};")
+        if read_only:
+            c.execute("PRAGMA query_only = ON;")
+        else:
+            c.execute(f"PRAGMA synchronous = {self.writer_synchronous};")
         return c
 
+    async def start(self):
+        """Start the group-commit writer task on the running loop."""
+        if self._writer_task is None:
+            self._write_queue = asyncio.Queue()
+            self._writer_task = asyncio.get_running_loop().create_task(self._writer_loop())
+
+    async def stop(self):
+        """Drain queued writes and stop the writer task."""
+        if self._writer_task is not None:
+            await self._write_queue.put(None)
+            await self._writer_task
+            self._writer_task = None
+            self._write_queue = None
+
+    async def _writer_loop(self):
+        loop = asyncio.get_running_loop()
+        q = self._write_queue
+        stopping = False
+        while not stopping:
+            item = await q.get()
+            if item is None:
+                break
+            batch = [item]
+            deadline = loop.time() + self.write_window
+            while len(batch) < self.write_batch_size:
+                try:
+                    item = q.get_nowait()
+                except asyncio.QueueEmpty:
+                    timeout = deadline - loop.time()
+                    if timeout <= 0:
+                        break
+                    try:
+                        item = await asyncio.wait_for(q.get(), timeout)
+                    except asyncio.TimeoutError:
+                        break
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+            try:
+                async with self._write_gate:
+                    outcomes = await self._executor.run(self._commit_batch, batch, label="group commit")
+            except Exception as e:
+                outcomes = [(None, e)] * len(batch)
+            for (_, _, _, fut), (result, err) in zip(batch, outcomes):
+                if fut.done():
+                    continue
+                if err is None:
+                    fut.set_result(result)
+                else:
+                    fut.set_exception(err)
+
+    def _commit_batch(self, batch) -> List[Tuple[Optional[List[Row]], Optional[BaseException]]]:
+        """Run a batch of writes in one transaction; one failing statement
+        is rolled back to its savepoint without sinking the rest. Items that
+        asked for rows (RETURNING) get them back as their result."""
+        outcomes: List[Tuple[Optional[List[Row]], Optional[BaseException]]] = []
+        with self._sync_connection() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            for query, params, returning, _ in batch:
+                conn.execute("SAVEPOINT write_item")
+                try:
+                    if returning:
+                        cur = _query(conn, query, params, self.compact_rows)
+                        result = _rows(cur, cur.fetchall(), self.compact_rows)
+                    else:
+                        conn.execute(query, params)
+                        result = None
+                    conn.execute("RELEASE write_item")
+                    outcomes.append((result, None))
+                except Exception as e:
+                    conn.execute("ROLLBACK TO write_item")
+                    conn.execute("RELEASE write_item")
+                    outcomes.append((None, e))
+        return outcomes
+
+    def _begin(self):
+        self._writer_lock.acquire()
+        try:
+            self._writer.execute("BEGIN IMMEDIATE")
+        except BaseException:
+            self._writer_lock.release()
+            raise
+
+    def _end(self, commit: bool):
+        try:
+            if commit:
+                try:
+                    self._writer.commit()
+                except BaseException:
+                    self._writer.rollback()
+                    raise
+            else:
+                self._writer.rollback()
+        finally:
+            self._writer_lock.release()
+
+    @asynccontextmanager
+    async def transaction(self):
+        """Run a unit of work on the writer connection.
+
+        BEGIN IMMEDIATE (which may wait up to busy_timeout for the database
+        lock), every statement and the COMMIT each run on the hot executor;
+        the loop only awaits them. Ending the unit is never refused for
+        saturation, and a cancelled caller still waits for it to land.
+        """
+        async with self._write_gate:
+            begin = asyncio.ensure_future(self._executor.run(self._begin, label="BEGIN IMMEDIATE"))
+            try:
+                await asyncio.shield(begin)
+            except asyncio.CancelledError:
+                await asyncio.wait({begin})
+                if not begin.cancelled() and begin.exception() is None:
+                    await _settled(self._executor.run(self._end, False, label="ROLLBACK", force=True))
+                raise
+            try:
+                yield SQLiteTransaction(self._writer, self._executor, self.compact_rows)
+            except BaseException:
+                await _settled(self._executor.run(self._end, False, label="ROLLBACK", force=True))
+                raise
+            await _settled(self._executor.run(self._end, True, label="COMMIT", force=True))
+
+    def metrics(self) -> Dict[str, Any]:
+        """Queue depth, rejections and per-query wait/run times of both executors."""
+        return {"hot": self._executor.metrics(), "bulk": self._bulk_executor.metrics()}
+
+    def close(self):
+        """Close every pooled connection and stop the executors."""
+        self._executor.shutdown()
+        self._bulk_executor.shutdown()
+        with self._writer_lock:
+            self._writer.close()
+        for pool in (self._readers, self._bulk_readers):
+            while True:
+                try:
+                    pool.get_nowait().close()
+                except queue.Empty:
+                    break
+
     def _init_and_migrate(self):
         logger.info("[SQLite] Ensuring DB and applying migrations")
         with self._sync_connection() as conn:
@@ -62,42 +354,96 @@ class SovereignSQLite:
 
     @contextmanager
     def _sync_connection(self):
-        conn = self._connect()
+        """Borrow the writer connection for one committed transaction."""
+        with self._writer_lock:
+            conn = self._writer
+            try:
+                yield conn
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+
+    @contextmanager
+    def _read_connection(self):
+        """Borrow a query-only reader connection from the pool."""
+        conn = self._readers.get()
         try:
             yield conn
-            conn.commit()
-        except Exception:
-            conn.rollback()
-            raise
         finally:
-            conn.close()
+            self._readers.put(conn)
 
-    async def fetchrow(self, query: str, *params) -> Optional[Dict[str, Any]]:
+    async def fetchrow(self, query: str, *params) -> Optional[Row]:
         def _fn():
-            with self._sync_connection() as conn:
-                r = conn.execute(query, params).fetchone()
-                return dict(r) if r else None
-        return await asyncio.get_event_loop().run_in_executor(None, _fn)
+            with self._read_connection() as conn:
+                cur = _query(conn, query, params, self.compact_rows)
+                r = cur.fetchone()
+                return _rows(cur, [r], self.compact_rows)[0] if r else None
+        return await self._executor.run(_fn, label=query)
 
-    async def fetch(self, query: str, *params) -> List[Dict[str, Any]]:
+    async def fetch(self, query: str, *params) -> List[Row]:
         def _fn():
-            with self._sync_connection() as conn:
-                rows = conn.execute(query, params).fetchall()
-                return [dict(r) for r in rows]
-        return await asyncio.get_event_loop().run_in_executor(None, _fn)
+            with self._read_connection() as conn:
+                cur = _query(conn, query, params, self.compact_rows)
+                return _rows(cur, cur.fetchall(), self.compact_rows)
+        return await self._executor.run(_fn, label=query)
 
     async def execute(self, query: str, *params) -> None:
+        """Run a write; resolves once the batch containing it has committed."""
+        await self._write(query, params, False)
+
+    async def execute_returning(self, query: str, *params) -> List[Row]:
+        """Run a write with a RETURNING clause through the group-commit writer;
+        resolves with its rows once the batch containing it has committed."""
+        return await self._write(query, params, True)
+
+    async def _write(self, query: str, params, returning: bool):
+        if self._write_queue is not None:
+            fut = asyncio.get_running_loop().create_future()
+            await self._write_queue.put((query, params, returning, fut))
+            return await fut
         def _fn():
             with self._sync_connection() as conn:
-                conn.execute(query, params)
-        await asyncio.get_event_loop().run_in_executor(None, _fn)
+                cur = _query(conn, query, params, self.compact_rows)
+                return _rows(cur, cur.fetchall(), self.compact_rows) if returning else None
+        async with self._write_gate:
+            return await self._executor.run(_fn, label=query)
+
+    async def iterate(self, query: str, *params, chunk_size: int = ITERATE_CHUNK_DEFAULT) -> AsyncIterator[Row]:
+        """Stream rows from a reader connection, ``chunk_size`` rows per executor hop.
+
+        The next chunk is only fetched once the consumer has drained the
+        previous one, so memory stays flat however large the result is.
+        Runs on the bulk executor and its own reader connections, one of
+        which is held until the generator is exhausted or closed.
+        """
+        bulk = self._bulk_executor
+        async with self._bulk_slots:
+            conn = self._bulk_readers.get_nowait()
+            cur = None
+            try:
+                cur = await bulk.run(_query, conn, query, params, self.compact_rows, label=query)
+                while True:
+                    rows = await bulk.run(cur.fetchmany, chunk_size, label=query)
+                    if not rows:
+                        break
+                    for r in _rows(cur, rows, self.compact_rows):
+                        yield r
+            finally:
+                if cur is not None:
+                    cur.close()
+                self._bulk_readers.put(conn)
 
     async def fetchval(self, query: str, *params) -> Any:
         def _fn():
-            with self._sync_connection() as conn:
+            with self._read_connection() as conn:
                 r = conn.execute(query, params).fetchone()
                 return r[0] if r else None
-        return await asyncio.get_event_loop().run_in_executor(None, _fn)
+        return await self._executor.run(_fn, label=query)
+
+    async def executemany(self, query: str, args) -> None:
+        async with self.transaction() as tx:
+            await tx.executemany(query, args)
 
     def ensure_seed(self):
         with self._sync_connection() as conn:
@@ -119,10 +465,15 @@ class SovereignSQLite:
             ins("SPECOPS","Special Operations",2,{"payment":True,"multisig":1})
             ins("DIRECTOR","Command Director",3,{"payment":True,"multisig":0})
             # grant RECRUIT to mock user
+            access_id = str(uuid.uuid4())
             conn.execute("""
                 INSERT INTO user_node_access (id,user_id,node_id,status,source,unlocked)
                 VALUES (?, ?, (SELECT id FROM nodes WHERE code='RECRUIT'), 'approved', 'system', 1)
-            """, (str(uuid.uuid4()), "MOCK-USER-12345"))
+            """, (access_id, "MOCK-USER-12345"))
+            conn.execute("""
+                INSERT INTO user_entitlements (user_id,node_id,unlocked,source,access_id)
+                VALUES (?, (SELECT id FROM nodes WHERE code='RECRUIT'), 1, 'system', ?)
+            """, ("MOCK-USER-12345", access_id))
 
 _sqlite_instance: Optional[SovereignSQLite] = None
 
@@ -131,6 +482,7 @@ async def setup_db_pool():
     if _sqlite_instance is None:
         _sqlite_instance = SovereignSQLite()
         _sqlite_instance.ensure_seed()
+        await _sqlite_instance.start()
         logger.info(f"[SQLite] Initialized { _sqlite_instance.db_path }")
     return _sqlite_instance
 
@@ -142,5 +494,8 @@ def get_pool():
 
 async def shutdown_db_pool():
     global _sqlite_instance
+    if _sqlite_instance is not None:
+        await _sqlite_instance.stop()
+        _sqlite_instance.close()
     _sqlite_instance = None
     logger.info("[SQLite] Shutdown")
\ No newline at end of file
@@ -0,0 +1,138 @@
+# app/policy_compiler.py
+"""Compile node policy JSON into evaluators.
+
+A policy is compiled once when the catalog loads: keys are validated
+(unknown keys or wrong types raise PolicyError), the decision tuples are
+built up front, and the result is a CompiledPolicy whose ``evaluate`` is a
+single closure call on the hot path. ``inputs`` records what a decision can
+depend on; has_access_many (app/enforcement) walks the prerequisite graph
+only when a requested node has the ``prerequisites`` input.
+
+Known keys:
+    open              bool       anyone may enter
+    payment           bool       unlocked by a Stripe payment
+    multisig          int >= 0   distinct approvals required (0 and 1 both mean one)
+    roles             [str]      roles allowed to approve (empty: any role)
+    council_vote      bool       quorum also needs one approval from the Council role
+    requires          [str]      prerequisite node codes / milestones (see app/prerequisites)
+    provides          [str]      milestones this node satisfies for other nodes' ``requires``
+    ritual            bool       archived lattice flag (recorded, not enforced)
+    dependency_check  bool       archived lattice flag (recorded, not enforced)
+"""
+import json
+from typing import Any, Callable, Dict, FrozenSet, Mapping, Tuple
+
+COUNCIL_ROLE = "Council"
+
+Decision = Tuple[bool, str, Dict[str, Any]]
+
+# Inputs a decision may depend on
+INPUT_GRANT = "grant"
+INPUT_PAYMENT = "payment"
+INPUT_APPROVALS = "approvals"
+INPUT_PREREQUISITES = "prerequisites"
+
+_BOOL_KEYS = ("open", "payment", "council_vote", "ritual", "dependency_check")
+_LIST_KEYS = ("requires", "provides", "roles")
+KNOWN_KEYS = frozenset(_BOOL_KEYS + _LIST_KEYS + ("multisig",))
+
+class PolicyError(ValueError):
+    pass
+
+class CompiledPolicy:
+    __slots__ = ("source", "kind", "requires", "provides", "multisig", "roles", "council_vote", "inputs", "evaluate")
+
+    def __init__(self, source: Dict[str, Any], kind: str, requires: Tuple[str, ...], provides: Tuple[str, ...],
+                 multisig: int, roles: Tuple[str, ...], council_vote: bool, inputs: FrozenSet[str],
+                 evaluate: Callable[[bool], Decision]):
+        self.source = source
+        self.kind = kind  # open | payment | approval | invalid
+        self.requires = requires
+        self.provides = provides
+        self.multisig = multisig
+        self.roles = roles
+        self.council_vote = council_vote
+        self.inputs = inputs
+        self.evaluate = evaluate
+
+    @property
+    def required_approvals(self) -> int:
+        return max(1, self.multisig)
+
+    def role_permitted(self, role: str) -> bool:
+        return not self.roles or role in self.roles
+
+    def quorum_reached(self, approvals_by_role: Mapping[str, int]) -> bool:
+        """Whether the approval tally (distinct approvers per role) satisfies this policy."""
+        counted = sum(n for role, n in approvals_by_role.items() if self.role_permitted(role))
+        if counted < self.required_approvals:
+            return False
+        return not self.council_vote or approvals_by_role.get(COUNCIL_ROLE, 0) > 0
+
+    def __repr__(self):
+        return f"CompiledPolicy({self.kind}, inputs={sorted(self.inputs)})"
+
+def _parse(policy: Any) -> Dict[str, Any]:
+    if not policy:
+        return {}
+    if isinstance(policy, str):
+        try:
+            policy = json.loads(policy)
+        except ValueError as e:
+            raise PolicyError(f"policy is not valid JSON: {e}")
+    if not isinstance(policy, Mapping):
+        raise PolicyError(f"policy must be an object, got {type(policy).__name__}")
+    return dict(policy)
+
+def _validate(policy: Dict[str, Any]):
+    unknown = sorted(set(policy) - KNOWN_KEYS)
+    if unknown:
+        raise PolicyError(f"unknown policy keys: {', '.join(unknown)}")
+    for key in _BOOL_KEYS:
+        if key in policy and not isinstance(policy[key], bool):
+            raise PolicyError(f"{key} must be a boolean")
+    for key in _LIST_KEYS:
+        value = policy.get(key)
+        if value is not None and (not isinstance(value, list) or not all(isinstance(v, str) for v in value)):
+            raise PolicyError(f"{key} must be a list of strings")
+    multisig = policy.get("multisig", 0)
+    if isinstance(multisig, bool) or not isinstance(multisig, int) or multisig < 0:
+        raise PolicyError("multisig must be a non-negative integer")
+
+def _evaluator(granted: Decision, otherwise: Decision) -> Callable[[bool], Decision]:
+    def evaluate(approved: bool) -> Decision:
+        return granted if approved else otherwise
+    return evaluate
+
+_GRANTED: Decision = (True, "already_approved", {})
+
+def compile_policy(policy: Any, tier: int = 0) -> CompiledPolicy:
+    """Validate and compile one policy; raises PolicyError. Decision info dicts are shared, do not mutate."""
+    source = _parse(policy)
+    _validate(source)
+    requires = tuple(source.get("requires") or ())
+    provides = tuple(source.get("provides") or ())
+    roles = tuple(source.get("roles") or ())
+    multisig = source.get("multisig", 0)
+    council_vote = source.get("council_vote", False)
+
+    inputs = {INPUT_GRANT}
+    if requires:
+        inputs.add(INPUT_PREREQUISITES)
+    if source.get("open"):
+        kind, otherwise = "open", (True, "open_access", {})
+    elif source.get("payment"):
+        kind, otherwise = "payment", (False, "requires_payment", {"tier": tier})
+        inputs.add(INPUT_PAYMENT)
+    else:
+        kind, otherwise = "approval", (False, "requires_approval", {"policy": source})
+    if kind != "open" and (multisig or roles or council_vote):
+        inputs.add(INPUT_APPROVALS)
+    return CompiledPolicy(source, kind, requires, provides, multisig, roles, council_vote,
+                          frozenset(inputs), _evaluator(_GRANTED, otherwise))
+
+def invalid_policy(policy: Any, error: Exception) -> CompiledPolicy:
+    """Deny-all stand-in for a policy that failed to compile (an existing grant still holds)."""
+    source = policy if isinstance(policy, dict) else {}
+    return CompiledPolicy(source, "invalid", (), (), 0, (), False, frozenset({INPUT_GRANT}),
+                          _evaluator(_GRANTED, (False, "invalid_policy", {"error": str(error)})))
@@ -0,0 +1,203 @@
+# app/prerequisites.py
+"""Prerequisite graph for policy ``requires`` chains.
+
+Built once per catalog snapshot. Each ``requires`` entry resolves to one or
+more nodes, first match wins (names compare case-insensitively with ``_``
+and ``.`` treated alike):
+
+    node code            ``REVELATION.2``
+    provided milestone   every node whose policy lists it in ``provides``
+    ``<code>_complete``  the node ``<code>`` (``revelation_1_complete``)
+    ``all_<group>``      every node whose code starts ``<GROUP>.``, plural
+                         ``s`` optional (``all_revelations``)
+
+A requirement is met once all of its nodes are reached. A name that
+resolves to no node is a user milestone (``glyph``, ``pull_mode``,
+``initiation``: evidence a user earns outside the lattice, rows in
+user_milestones, migrations/0009), met when the user holds it. Milestones
+get catalog bits like nodes (``milestone_key``) and load into the same
+entitlement bitset, and are listed per node in ``milestones``. Cycles are
+detected at build time and their nodes returned in ``cyclic`` so the
+catalog can reject them; everything else gets a topological order.
+
+``blocked(granted)`` walks that order once over the user's entitlement
+bitset (catalog node and milestone bits): a node is reached when the user
+holds a grant on it, or it is open and all its prerequisites are reached.
+It returns the ungranted nodes whose prerequisites are unmet, with the
+names that are missing; a grant the user already holds is never blocked. Results are
+memoized by the bitset itself, so a deep chain costs one dict lookup after
+the first check, and users with the same entitlements share an entry.
+"""
+import os
+from collections import OrderedDict, deque
+from typing import Any, Callable, Dict, FrozenSet, List, Sequence, Tuple
+
+MEMO_SIZE = int(os.getenv("SOVEREIGN_PREREQ_MEMO_SIZE", "4096"))
+
+Blocked = Dict[str, Tuple[str, ...]]  # node id -> missing requirement names
+
+def _norm(name: str) -> str:
+    return name.upper().replace("_", ".")
+
+def milestone_name(name: str) -> str:
+    """Stored form of a milestone name (user_milestones.name)."""
+    return name.strip().lower().replace(".", "_")
+
+def milestone_key(name: str) -> str:
+    """Catalog bit key for a milestone; the grants queries select the same string."""
+    return "milestone:" + milestone_name(name)
+
+class PrerequisiteGraph:
+    def __init__(self, nodes: Sequence[Dict[str, Any]], bit_for: Callable[[str], int], memo_size: int = MEMO_SIZE):
+        by_code = {n["code"]: n for n in nodes}
+        by_norm = {_norm(code): n for code, n in by_code.items()}
+        providers: Dict[str, List[str]] = {}
+        groups: Dict[str, List[str]] = {}
+        for n in nodes:
+            for name in n["rule"].provides:
+                providers.setdefault(_norm(name), []).append(n["id"])
+            groups.setdefault(_norm(n["code"]).split(".", 1)[0], []).append(n["id"])
+
+        def resolve(name: str, node_id: str) -> List[str]:
+            key = _norm(name)
+            target = by_code.get(name) or by_norm.get(key)
+            if target:
+                return [target["id"]]
+            if key in providers:
+                return providers[key]
+            if key.endswith(".COMPLETE") and key[:-9] in by_norm:
+                return [by_norm[key[:-9]]["id"]]
+            if key.startswith("ALL."):
+                group = key[4:]
+                members = groups.get(group) or (groups.get(group[:-1]) if group.endswith("S") else None)
+                return [m for m in members or () if m != node_id]
+            return []
+
+        self.memo_size = max(1, memo_size)
+        self.milestones: Dict[str, List[str]] = {}  # node code -> milestone names it requires
+        # node id -> [(requirement name, prerequisite node ids)]; a milestone has none
+        self._requires: Dict[str, List[Tuple[str, List[str]]]] = {}
+        self._milestone_bits: Dict[str, int] = {}
+        self._open: Dict[str, bool] = {}
+        self._bit = {n["id"]: n["bit"] for n in nodes}
+        dependents: Dict[str, List[str]] = {}
+        for n in nodes:
+            reqs = n["rule"].requires
+            if not reqs:
+                continue
+            resolved = []
+            for name in dict.fromkeys(reqs):
+                targets = resolve(name, n["id"])
+                resolved.append((name, targets))
+                if not targets:
+                    self.milestones.setdefault(n["code"], []).append(name)
+                    self._milestone_bits[name] = bit_for(milestone_key(name))
+                for target in targets:
+                    dependents.setdefault(target, []).append(n["id"])
+            self._requires[n["id"]] = resolved
+        members = set(self._requires) | set(dependents)
+        for n in nodes:
+            if n["id"] in members:
+                self._open[n["id"]] = n["rule"].kind == "open"
+        self.edges = sum(len(v) for v in dependents.values())
+        self.order, self.cyclic = self._sort(members, dependents)
+        # nodes downstream of a cycle: never reachable, evaluated after the ordered pass
+        self._tail = [m for m in members - set(self.order) - self.cyclic if m in self._requires]
+        self._codes = {n["id"]: n["code"] for n in nodes}
+        # rejected by the catalog: reached only through a grant, never reported as blocked
+        self._rejected = self.cyclic
+        # held milestones seed the walk
+        self._milestone_mask = self._mask_of(self._milestone_bits.values())
+        # prerequisite ids (or the milestone bit) -> one mask per requirement for the walk
+        self._requires = {node_id: [(name, self._mask(ids) if ids else self._milestone_bits[name]) for name, ids in reqs]
+                          for node_id, reqs in self._requires.items()}
+        self._memo: "OrderedDict[int, Blocked]" = OrderedDict()
+        self.hits = self.misses = 0
+
+    def _mask(self, node_ids) -> int:
+        return self._mask_of(self._bit[node_id] for node_id in node_ids)
+
+    @staticmethod
+    def _mask_of(bits) -> int:
+        mask = 0
+        for bit in bits:
+            mask |= bit
+        return mask
+
+    def _sort(self, members, dependents) -> Tuple[List[str], FrozenSet[str]]:
+        """Kahn's algorithm; what is left over sits on (or between) cycles once downstream tails are peeled."""
+        indegree = {m: 0 for m in members}
+        for deps in dependents.values():
+            for d in deps:
+                indegree[d] += 1
+        ready = deque(m for m in members if indegree[m] == 0)
+        order = []
+        while ready:
+            m = ready.popleft()
+            order.append(m)
+            for d in dependents.get(m, ()):
+                indegree[d] -= 1
+                if indegree[d] == 0:
+                    ready.append(d)
+        stuck = set(members) - set(order)
+        # drop nodes that only hang off a cycle: nothing still stuck depends on them
+        changed = True
+        while changed:
+            changed = False
+            for m in list(stuck):
+                if not any(d in stuck for d in dependents.get(m, ())):
+                    stuck.discard(m)
+                    changed = True
+        return order, frozenset(stuck)
+
+    def cycle_codes(self) -> List[str]:
+        return sorted(self._codes[m] for m in self.cyclic)
+
+    def blocked(self, granted: int) -> Blocked:
+        """Ungranted nodes whose prerequisites the user has not reached; treat the result as read-only.
+
+        Cyclic nodes (rejected by the catalog) are left out and only count as reached when granted.
+        """
+        if not self._requires:
+            return {}
+        memo = self._memo.get(granted)
+        if memo is not None:
+            self._memo.move_to_end(granted)
+            self.hits += 1
+            return memo
+        self.misses += 1
+        reachable = granted & self._milestone_mask
+        blocked: Blocked = {}
+        for node_id in self.order:
+            bit = self._bit[node_id]
+            if granted & bit:
+                reachable |= bit  # a grant already held stands
+                continue
+            if node_id in self._rejected:
+                continue
+            reqs = self._requires.get(node_id)
+            if reqs:
+                missing = tuple(name for name, mask in reqs if reachable & mask != mask)
+                if missing:
+                    blocked[node_id] = missing
+                    continue
+            if self._open[node_id]:
+                reachable |= bit
+        for node_id in self._tail:
+            if not granted & self._bit[node_id] and node_id not in self._rejected:
+                blocked[node_id] = tuple(name for name, mask in self._requires[node_id] if reachable & mask != mask)
+        self._memo[granted] = blocked
+        if len(self._memo) > self.memo_size:
+            self._memo.popitem(last=False)
+        return blocked
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "nodes": len(self._open),
+            "edges": self.edges,
+            "cyclic": self.cycle_codes(),
+            "milestones": self.milestones,
+            "memo_entries": len(self._memo),
+            "memo_hits": self.hits,
+            "memo_misses": self.misses,
+        }
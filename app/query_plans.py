@@ -0,0 +1,156 @@
+# app/query_plans.py
+"""Query-plan regression check for the access tables.
+
+Collects every literal SQL statement in app/*.py, asks the database for its
+plan and fails on a full-table scan of a watched table:
+
+    python -m app.query_plans              # SQLite (fresh DB, all migrations)
+    DATABASE_URL=... python -m app.query_plans --postgres
+
+SQLite plans come from EXPLAIN QUERY PLAN; a bare ``SCAN <table>`` (no index)
+is a violation. Postgres plans come from EXPLAIN (FORMAT JSON) with
+enable_seqscan off, so a remaining ``Seq Scan`` means no usable index exists.
+
+A statement that is meant to touch every row (e.g. a rebuild) opts out with
+a ``-- plan: full-scan-ok`` comment.
+"""
+import argparse
+import ast
+import asyncio
+import json
+import os
+import re
+import sqlite3
+import sys
+import tempfile
+from typing import Dict, List, NamedTuple, Optional
+
+from app.sql import POSTGRES, compile_sql
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+WATCHED_TABLES = ("user_node_access", "user_node_approvals", "user_node_approval_tallies", "user_entitlements")
+
+_SQL_START = re.compile(r"^\s*(SELECT|INSERT|UPDATE|DELETE|WITH)\b", re.IGNORECASE)
+_FULL_SCAN_OK = re.compile(r"--\s*plan:\s*full-scan-ok", re.IGNORECASE)
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_TABLE_REF = re.compile(r"\b(%s)\b(?:\s+(?:AS\s+)?(\w+))?" % "|".join(WATCHED_TABLES), re.IGNORECASE)
+_NOT_ALIASES = {
+    "where", "on", "join", "inner", "left", "right", "cross", "set", "order", "group", "limit",
+    "values", "select", "using", "union", "as", "natural", "having", "returning", "default",
+}
+
+class Query(NamedTuple):
+    source: str
+    line: int
+    sql: str
+
+class Violation(NamedTuple):
+    query: Query
+    detail: str
+
+def collect_queries(app_dir: str = APP_DIR) -> List[Query]:
+    """Every string constant in app/*.py that starts like a DML statement."""
+    found: List[Query] = []
+    for fname in sorted(os.listdir(app_dir)):
+        if not fname.endswith(".py"):
+            continue
+        path = os.path.join(app_dir, fname)
+        with open(path, "r", encoding="utf-8") as f:
+            tree = ast.parse(f.read(), filename=path)
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Constant) and isinstance(node.value, str) and _SQL_START.match(node.value):
+                if _FULL_SCAN_OK.search(node.value):
+                    continue
+                found.append(Query(fname, node.lineno, node.value.strip()))
+    return found
+
+def placeholder_count(sql: str) -> int:
+    return _STRING_LITERAL.sub("", sql).count("?")
+
+def watched_aliases(sql: str) -> Dict[str, str]:
+    """Map every name a watched table appears under in ``sql`` to the table."""
+    names: Dict[str, str] = {}
+    for m in _TABLE_REF.finditer(sql):
+        table = m.group(1).lower()
+        names[table] = table
+        alias = m.group(2)
+        if alias and alias.lower() not in _NOT_ALIASES:
+            names[alias] = table
+    return names
+
+def check_sqlite(queries: List[Query], db_path: Optional[str] = None) -> List[Violation]:
+    from app.persistence import SovereignSQLite
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db = SovereignSQLite(db_path or os.path.join(tmp, "plans.db"), readers=1)
+        try:
+            with db._sync_connection() as conn:
+                return [v for q in queries for v in _sqlite_violations(conn, q)]
+        finally:
+            db.close()
+
+def _sqlite_violations(conn: sqlite3.Connection, q: Query) -> List[Violation]:
+    names = watched_aliases(q.sql)
+    if not names:
+        return []
+    params = [None] * placeholder_count(q.sql)
+    plan = conn.execute("EXPLAIN QUERY PLAN " + q.sql, params).fetchall()
+    out = []
+    for row in plan:
+        detail = row[3]
+        m = re.match(r"SCAN (\w+)(.*)$", detail)
+        if m and m.group(1) in names and "USING" not in m.group(2):
+            out.append(Violation(q, detail))
+    return out
+
+async def check_postgres(queries: List[Query], dsn: str) -> List[Violation]:
+    import asyncpg
+
+    conn = await asyncpg.connect(dsn)
+    try:
+        await conn.execute("SET enable_seqscan = off")
+        out = []
+        for q in queries:
+            if not watched_aliases(q.sql):
+                continue
+            sql = compile_sql(q.sql, POSTGRES)
+            n = placeholder_count(q.sql)
+            # Plain EXPLAIN (no ANALYZE) plans writes without executing them
+            plan = await conn.fetchval(f"EXPLAIN (FORMAT JSON) {sql}", *([None] * n))
+            for node in _plan_nodes(json.loads(plan)[0]["Plan"]):
+                if node.get("Node Type") == "Seq Scan" and node.get("Relation Name") in WATCHED_TABLES:
+                    out.append(Violation(q, f"Seq Scan on {node['Relation Name']}"))
+        return out
+    finally:
+        await conn.close()
+
+def _plan_nodes(node):
+    yield node
+    for child in node.get("Plans", []):
+        yield from _plan_nodes(child)
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--postgres", action="store_true", help="check plans against DATABASE_URL")
+    ap.add_argument("--db", help="SQLite file to plan against (default: a fresh migrated DB)")
+    args = ap.parse_args(argv)
+
+    queries = collect_queries()
+    if args.postgres:
+        dsn = os.environ.get("DATABASE_URL")
+        if not dsn:
+            print("DATABASE_URL is not set", file=sys.stderr)
+            return 2
+        violations = asyncio.run(check_postgres(queries, dsn))
+    else:
+        violations = check_sqlite(queries, args.db)
+
+    watched = sum(1 for q in queries if watched_aliases(q.sql))
+    for v in violations:
+        first_line = v.query.sql.splitlines()[0]
+        print(f"FULL SCAN {v.query.source}:{v.query.line}: {v.detail}  [{first_line}]")
+    print(f"{watched} queries touch {', '.join(WATCHED_TABLES)}; {len(violations)} full scans")
+    return 1 if violations else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
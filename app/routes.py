@@ -1,7 +1,7 @@
 # app/routes.py
 from fastapi import APIRouter, HTTPException
-from app.db import get_pool
-from app.enforcement import has_access, request_access
+from app.catalog import node_catalog
+from app.enforcement import MAX_BATCH_CODES, has_access, has_access_many, request_access
 from app.logger import logger
 
 router = APIRouter(prefix="/api", tags=["API"])
@@ -12,13 +12,13 @@ async def health():
 
 @router.get("/nodes/map")
 async def get_node_map():
-    db = get_pool()
-    nodes = await db.fetch("SELECT id, code, label, tier FROM nodes ORDER BY tier, code")
     MOCK_USER = "MOCK-USER-12345"
+    catalog = await node_catalog.current()
+    decisions = await has_access_many(MOCK_USER)
+    nodes = [{"id": n["id"], "code": n["code"], "label": n["label"], "tier": n["tier"]} for n in catalog.nodes]
     states = {}
-    for n in nodes:
-        unlocked, detail, info = await has_access(MOCK_USER, n["code"])
-        states[n["code"]] = {"unlocked":unlocked,"detail":detail,"info":info}
+    for code, (unlocked, detail, info) in decisions.items():
+        states[code] = {"unlocked":unlocked,"detail":detail,"info":info}
     return {"nodes": nodes, "states": states}
 
 @router.get("/access/status")
@@ -27,6 +27,18 @@ async def get_access_status(node_code: str):
     unlocked, detail, info = await has_access(MOCK_USER, node_code)
     return {"node_code": node_code, "unlocked": unlocked, "detail": detail, "info": info}
 
+@router.post("/access/status/batch")
+async def get_access_status_batch(data: dict):
+    MOCK_USER = "MOCK-USER-12345"
+    node_codes = data.get("node_codes")
+    if not isinstance(node_codes, list) or not all(isinstance(c, str) for c in node_codes):
+        raise HTTPException(400, "node_codes must be a list of strings")
+    if len(node_codes) > MAX_BATCH_CODES:
+        raise HTTPException(400, f"At most {MAX_BATCH_CODES} node_codes per request")
+    decisions = await has_access_many(MOCK_USER, node_codes)
+    return {"statuses": {code: {"unlocked": unlocked, "detail": detail, "info": info}
+                         for code, (unlocked, detail, info) in decisions.items()}}
+
 @router.post("/access/request")
 async def submit_access_request(data: dict):
     MOCK_USER = "MOCK-USER-12345"
@@ -0,0 +1,83 @@
+# app/rows.py
+"""Compact, tuple-backed result rows.
+
+A ``CompactRow`` keeps the driver's value tuple and points at a ``RowShape``
+shared by every row with the same column list, instead of copying each row
+into its own dict. JSON columns are decoded on first access and cached.
+"""
+import json
+from collections.abc import Mapping
+from typing import Any, Dict, Iterable, Sequence, Tuple
+
+JSON_COLUMNS = frozenset({"policy", "meta"})
+
+class RowShape:
+    """Column layout shared by all rows of one query shape."""
+    __slots__ = ("columns", "index", "json_slots")
+
+    def __init__(self, columns: Tuple[str, ...]):
+        self.columns = columns
+        self.index = {name: i for i, name in enumerate(columns)}
+        self.json_slots = frozenset(i for i, name in enumerate(columns) if name in JSON_COLUMNS)
+
+_shapes: Dict[Tuple[str, ...], RowShape] = {}
+
+def shape_for(description: Sequence[Sequence[Any]]) -> RowShape:
+    """Return the cached shape for a DB-API ``cursor.description``."""
+    columns = tuple(d[0] for d in description)
+    shape = _shapes.get(columns)
+    if shape is None:
+        shape = _shapes.setdefault(columns, RowShape(columns))
+    return shape
+
+class CompactRow(Mapping):
+    """Read-only mapping over a value tuple; JSON columns decode lazily."""
+    __slots__ = ("_shape", "_values", "_decoded")
+
+    def __init__(self, shape: RowShape, values: Sequence[Any]):
+        self._shape = shape
+        self._values = values
+        self._decoded = None
+
+    def __getitem__(self, key):
+        if isinstance(key, int):
+            return self._values[key]
+        i = self._shape.index[key]
+        if i in self._shape.json_slots:
+            return self._json(i)
+        return self._values[i]
+
+    def _json(self, i: int) -> Any:
+        if self._decoded is None:
+            self._decoded = {}
+        elif i in self._decoded:
+            return self._decoded[i]
+        raw = self._values[i]
+        value = json.loads(raw) if isinstance(raw, (str, bytes)) else raw
+        self._decoded[i] = value
+        return value
+
+    def __iter__(self):
+        return iter(self._shape.columns)
+
+    def __len__(self):
+        return len(self._values)
+
+    def __contains__(self, key):
+        return key in self._shape.index
+
+    def __repr__(self):
+        return f"CompactRow({self.as_dict()!r})"
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {name: self[name] for name in self._shape.columns}
+
+def compact_rows(description, rows: Iterable[Sequence[Any]]):
+    shape = shape_for(description)
+    return [CompactRow(shape, r) for r in rows]
+
+def json_default(obj: Any) -> Any:
+    """``json.dumps`` default hook that understands compact rows."""
+    if isinstance(obj, CompactRow):
+        return obj.as_dict()
+    return str(obj)
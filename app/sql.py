@@ -0,0 +1,50 @@
+# app/sql.py
+"""SQL templates compiled per dialect.
+
+Queries in app/ are written once in SQLite syntax (``?`` placeholders,
+``datetime('now')``, ``json_extract``, ``INSERT OR IGNORE``). ``compile_sql``
+rewrites a template for the target dialect and caches the result, so each
+template is translated once and the driver always sees identical text
+(which is what keys asyncpg's prepared-statement cache).
+"""
+import re
+from functools import lru_cache
+
+SQLITE = "sqlite"
+POSTGRES = "postgres"
+DIALECTS = (SQLITE, POSTGRES)
+
+_LITERAL_OR_PARAM = re.compile(r"'(?:[^']|'')*'|\?")
+_NOW = re.compile(r"datetime\(\s*'now'\s*\)", re.IGNORECASE)
+_JSON_EXTRACT = re.compile(r"json_extract\(\s*([\w.]+)\s*,\s*'\$\.(\w+)'\s*\)", re.IGNORECASE)
+_INSERT_OR_IGNORE = re.compile(r"^(\s*)INSERT\s+OR\s+IGNORE\s+INTO\b", re.IGNORECASE)
+_RETURNING = re.compile(r"\bRETURNING\b", re.IGNORECASE)
+
+@lru_cache(maxsize=1024)
+def compile_sql(template: str, dialect: str) -> str:
+    """Translate a SQLite-syntax template for ``dialect``."""
+    if dialect == SQLITE:
+        return template
+    if dialect != POSTGRES:
+        raise ValueError(f"Unknown SQL dialect {dialect!r}; expected one of {DIALECTS}")
+
+    sql = _NOW.sub("NOW()", template)
+    sql = _JSON_EXTRACT.sub(r"(\1->>'\2')", sql)
+
+    m = _INSERT_OR_IGNORE.match(sql)
+    if m:
+        sql = m.group(1) + "INSERT INTO" + sql[m.end():]
+        ret = _RETURNING.search(sql)
+        if ret:
+            sql = sql[:ret.start()].rstrip() + " ON CONFLICT DO NOTHING " + sql[ret.start():]
+        else:
+            sql = sql.rstrip().rstrip(";") + " ON CONFLICT DO NOTHING"
+
+    n = 0
+    def _param(match):
+        nonlocal n
+        if match.group(0) != "?":
+            return match.group(0)
+        n += 1
+        return f"${n}"
+    return _LITERAL_OR_PARAM.sub(_param, sql)
@@ -0,0 +1,119 @@
+# benchmarks/bench_backup_stream.py
+"""Throughput and peak RSS of the backup pipeline on a synthetic SQLite DB.
+
+Builds a DB of roughly --size-mb (2 GB by default; rows are half random,
+half compressible), then runs each pipeline in a fresh child process so
+ru_maxrss reflects only that pipeline:
+
+  whole-file   : the old path (read the file, one Fernet token, SHA-256 of it)
+  streaming-wN : online snapshot + framed compress/encrypt/hash (app.backup_codec)
+                 across N worker processes, once per --workers entry
+
+Peak RSS is the parent's; pool workers are reported separately.
+
+Run from the repository root:
+    python benchmarks/bench_backup_stream.py --size-mb 2048 --workers 1,2,4,8 --compression zlib
+"""
+import argparse
+import hashlib
+import multiprocessing as mp
+import os
+import resource
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def build_db(path: str, size_mb: int):
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.execute("CREATE TABLE blobs (id INTEGER PRIMARY KEY, body BLOB)")
+    row = 4096
+    rows = size_mb * 1024 * 1024 // row
+    batch = 1024
+    for start in range(0, rows, batch):
+        conn.executemany(
+            "INSERT INTO blobs (body) VALUES (?)",
+            ((os.urandom(row // 2) + b"A" * (row // 2),) for _ in range(min(batch, rows - start))),
+        )
+        conn.commit()
+    conn.close()
+
+
+def _whole_file(db_path: str, out_dir: str):
+    from cryptography.fernet import Fernet
+
+    with open(db_path, "rb") as f:
+        data = f.read()
+    token = Fernet(Fernet.generate_key()).encrypt(data)
+    hashlib.sha256(token).hexdigest()
+    with open(os.path.join(out_dir, "whole.enc"), "wb") as f:
+        f.write(token)
+
+
+def _streaming(db_path: str, out_dir: str, workers: int, compression: str):
+    from cryptography.fernet import Fernet
+    from app.backup_codec import encrypt_file
+    from app.backup_protocol import snapshot_sqlite
+
+    snap = os.path.join(out_dir, "snap.db")
+    snapshot_sqlite(db_path, snap)
+    manifest = encrypt_file(snap, os.path.join(out_dir, "stream.enc"), Fernet.generate_key(),
+                            workers=workers, compression=compression)
+    os.remove(snap)
+    return manifest["compression_ratio"]
+
+
+def _child(name: str, db_path: str, out_dir: str, workers: int, compression: str, results):
+    start = time.perf_counter()
+    ratio = None
+    if name == "whole-file":
+        _whole_file(db_path, out_dir)
+    else:
+        ratio = _streaming(db_path, out_dir, workers, compression)
+    elapsed = time.perf_counter() - start
+    results.put((elapsed, ratio, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+                 resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss))
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--size-mb", type=int, default=2048)
+    ap.add_argument("--skip-whole-file", action="store_true", help="skip the old path (it needs ~3x the DB in RAM)")
+    ap.add_argument("--workers", default=f"1,{os.cpu_count() or 1}", help="comma-separated worker counts")
+    ap.add_argument("--compression", default="zlib", choices=("zlib", "lzma"))
+    args = ap.parse_args()
+    worker_counts = sorted({int(w) for w in args.workers.split(",")})
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "synthetic.db")
+        print(f"building ~{args.size_mb} MB synthetic DB ...")
+        build_db(db_path, args.size_mb)
+        db_mb = os.path.getsize(db_path) / 1024 / 1024
+
+        ctx = mp.get_context("spawn")
+        results = ctx.Queue()
+        runs = [] if args.skip_whole_file else [("whole-file", 1)]
+        runs += [(f"streaming-w{w}", w) for w in worker_counts]
+        baseline = None
+        for name, workers in runs:
+            p = ctx.Process(target=_child, args=(name, db_path, tmp, workers, args.compression, results))
+            p.start()
+            p.join()
+            if p.exitcode != 0:
+                print(f"  {name:<14} failed (exit {p.exitcode}; likely OOM)")
+                continue
+            elapsed, ratio, rss_kb, child_rss_kb = results.get()
+            line = (f"  {name:<14} {db_mb / elapsed:8.1f} MB/s   peak RSS {rss_kb / 1024:8.1f} MB"
+                    f" (+{child_rss_kb / 1024:.1f} MB/worker)   ({elapsed:.1f}s)")
+            if ratio is not None:
+                baseline = baseline or elapsed
+                line += f"   ratio {ratio}   speedup x{baseline / elapsed:.2f}"
+            print(line)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+# benchmarks/bench_entitlements.py
+"""Entitlement checks: per-check SQL lookup vs the in-memory bitset store.
+
+Seeds --users users with --grants approved grants each over --nodes nodes,
+bulk-loads the bitset store, then reports per-check latency for
+  query     one indexed SELECT per (user, node) check (the old has_access)
+  has_access  enforcement.has_access served from the bitsets
+  bit test  the bare ``bits & node_bit`` that has_access reduces to
+and retained memory per million users for the bitsets and, for comparison,
+for frozensets of node ids (the LRU cache representation).
+
+Run from the repository root:
+    python benchmarks/bench_entitlements.py --users 100000 --grants 3 --checks 20000
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import persistence
+from app.catalog import node_catalog
+from app.enforcement import has_access
+from app.entitlements import REBUILD_SQL, entitlement_bits
+from app.persistence import SovereignSQLite
+
+CHECK_QUERY = "SELECT 1 FROM user_node_access WHERE user_id = ? AND node_id = ? AND status = 'approved'"
+
+
+def seed(db: SovereignSQLite, users: int, grants: int, nodes: int):
+    rng = random.Random(7)
+    node_ids = [str(uuid.uuid4()) for _ in range(nodes)]
+    user_ids = [f"BENCH-USER-{i:07d}" for i in range(users)]
+    with db._sync_connection() as conn:
+        conn.executemany("INSERT INTO nodes (id, code, label, tier, policy) VALUES (?, ?, ?, ?, '{}')",
+                         [(nid, f"BENCH-{i:04d}", f"Bench node {i}", i % 5) for i, nid in enumerate(node_ids)])
+        conn.executemany("INSERT INTO users (id, email, handle) VALUES (?, ?, ?)",
+                         [(u, f"{u}@bench", u) for u in user_ids])
+        conn.executemany(
+            "INSERT INTO user_node_access (id, user_id, node_id, status, source, unlocked) "
+            "VALUES (?, ?, ?, 'approved', 'system', 1)",
+            ((str(uuid.uuid4()), u, nid) for u in user_ids for nid in rng.sample(node_ids, grants)),
+        )
+        conn.execute(REBUILD_SQL)
+    return user_ids, node_ids
+
+
+def frozenset_bytes(db: SovereignSQLite) -> int:
+    with db._sync_connection() as conn:
+        rows = conn.execute("SELECT user_id, node_id FROM user_node_access WHERE status = 'approved'").fetchall()
+    tracemalloc.start()
+    sets = {}
+    for user_id, node_id in rows:
+        sets.setdefault(user_id, []).append(node_id)
+    sets = {u: frozenset(ids) for u, ids in sets.items()}
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del sets
+    return size
+
+
+async def run(db, user_ids, node_ids, checks: int):
+    await node_catalog.load()
+    start = time.perf_counter()
+    await entitlement_bits.load()
+    load_s = time.perf_counter() - start
+
+    tracemalloc.start()
+    await entitlement_bits.load()  # rebuilt under tracemalloc; the retained delta is the store
+    bits_bytes = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    snapshot = await node_catalog.current()
+    rng = random.Random(11)
+    pairs = [(rng.choice(user_ids), rng.choice(node_ids)) for _ in range(checks)]
+    codes = {n["id"]: n["code"] for n in snapshot.nodes}
+
+    start = time.perf_counter()
+    for u, n in pairs:
+        await db.fetchval(CHECK_QUERY, u, n)
+    query_us = (time.perf_counter() - start) / checks * 1e6
+
+    start = time.perf_counter()
+    for u, n in pairs:
+        await has_access(u, codes[n])
+    has_access_us = (time.perf_counter() - start) / checks * 1e6
+
+    node_bits = [(u, snapshot.by_id[n]["bit"]) for u, n in pairs]
+    start = time.perf_counter()
+    for u, bit in node_bits:
+        entitlement_bits.get(u) & bit
+    bit_us = (time.perf_counter() - start) / checks * 1e6
+    return load_s, bits_bytes, query_us, has_access_us, bit_us
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--users", type=int, default=100000)
+    ap.add_argument("--grants", type=int, default=3, help="approved grants per user")
+    ap.add_argument("--nodes", type=int, default=64)
+    ap.add_argument("--checks", type=int, default=20000)
+    args = ap.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db = SovereignSQLite(os.path.join(tmp, "bench.db"))
+        user_ids, node_ids = seed(db, args.users, args.grants, args.nodes)
+        persistence._sqlite_instance = db
+        load_s, bits_bytes, query_us, has_access_us, bit_us = asyncio.run(run(db, user_ids, node_ids, args.checks))
+        sets_bytes = frozenset_bytes(db)
+        db.close()
+
+    scale = 1_000_000 / args.users
+    print(f"{args.users} users x {args.grants} grants over {args.nodes} nodes, {args.checks} checks")
+    print(f"  bulk load          : {load_s:8.2f} s ({load_s * scale:.1f} s per million users)")
+    print(f"  query per check    : {query_us:8.1f} us")
+    print(f"  has_access (bits)  : {has_access_us:8.1f} us")
+    print(f"  bit test           : {bit_us:8.3f} us")
+    print(f"  memory, bitsets    : {bits_bytes * scale / 2**20:8.0f} MiB per million users")
+    print(f"  memory, frozensets : {sets_bytes * scale / 2**20:8.0f} MiB per million users")
+
+
+if __name__ == "__main__":
+    main()
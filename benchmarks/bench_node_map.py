@@ -0,0 +1,104 @@
+# benchmarks/bench_node_map.py
+"""Node-map latency as the catalog grows: per-node has_access vs has_access_many.
+
+"per-node" reproduces the old /api/nodes/map (one nodes query, then
+has_access per node); "batched" is the single has_access_many behind the
+new map.
+
+The in-process caches are reset and disabled for both (as in
+bench_has_access.py), so every access check makes its database round
+trips: per-node pays them once per node, batched once per map. With the
+caches on, both would be measuring dict lookups.
+
+Run from the repository root:
+    python benchmarks/bench_node_map.py --nodes 10,100,1000 --repeat 50
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import persistence
+from app.catalog import node_catalog
+from app.enforcement import has_access, has_access_many
+from app.entitlements import entitlement_bits, entitlement_cache
+from app.persistence import SovereignSQLite
+
+USER = "MOCK-USER-12345"
+
+
+def add_nodes(db: SovereignSQLite, count: int):
+    with db._sync_connection() as conn:
+        conn.executemany(
+            "INSERT INTO nodes (id, code, label, tier, policy) VALUES (?, ?, ?, ?, ?)",
+            [(str(uuid.uuid4()), f"BENCH-{i:05d}", f"Bench node {i}", i % 5,
+              json.dumps({"payment": i % 2 == 0, "multisig": i % 3}))
+             for i in range(count)],
+        )
+
+
+def uncached():
+    """Drop and disable the in-process caches so every access check queries the database."""
+    node_catalog._snapshot = None
+    node_catalog.check_interval = 0.0
+    entitlement_bits.enabled = entitlement_bits.loaded = False
+    entitlement_bits._bits = {}
+    entitlement_bits.check_interval = 0.0
+    entitlement_cache.clear()
+    entitlement_cache.ttl_s = 0.0
+
+
+async def per_node():
+    db = persistence.get_pool()
+    nodes = await db.fetch("SELECT id, code, label, tier FROM nodes ORDER BY tier, code")
+    for n in nodes:
+        _, detail, info = await has_access(USER, n["code"])
+        assert detail != "error", info
+
+
+async def batched():
+    results = await has_access_many(USER)
+    assert all(detail != "error" for _, detail, _ in results.values())
+
+
+async def _time(fn, repeat: int) -> float:
+    await fn()  # warm up
+    start = time.perf_counter()
+    for _ in range(repeat):
+        await fn()
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--nodes", default="10,100,1000", help="comma-separated extra node counts")
+    ap.add_argument("--repeat", type=int, default=50)
+    args = ap.parse_args()
+
+    async def run():
+        # one event loop throughout: the catalog and entitlement locks are bound to it
+        print(f"{'nodes':>7} {'per-node ms':>12} {'batched ms':>11} {'speedup':>8}")
+        for count in [int(n) for n in args.nodes.split(",")]:
+            with tempfile.TemporaryDirectory() as tmp:
+                db = SovereignSQLite(os.path.join(tmp, "bench.db"))
+                db.ensure_seed()
+                add_nodes(db, count)
+                persistence._sqlite_instance = db
+                uncached()
+                slow = await _time(per_node, args.repeat)
+                uncached()
+                fast = await _time(batched, args.repeat)
+                db.close()
+            print(f"{count + 4:>7} {slow:>12.2f} {fast:>11.2f} {slow / fast:>7.1f}x")
+
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    main()
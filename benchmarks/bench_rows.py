@@ -0,0 +1,84 @@
+# benchmarks/bench_rows.py
+"""Allocations and time per 10k rows: dict rows vs CompactRow.
+
+Both sides fetch the same rows through SovereignSQLite.fetch and keep them
+alive (live blocks/KiB are measured at that point), then read every
+``policy`` twice, as has_access would across calls.
+
+Run from the repository root:
+    python benchmarks/bench_rows.py --rows 10000
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.persistence import SovereignSQLite
+
+
+def _seed(path: str, rows: int):
+    db = SovereignSQLite(path)
+    with db._sync_connection() as conn:
+        conn.executemany(
+            "INSERT INTO nodes (id, code, label, tier, policy) VALUES (?, ?, ?, ?, ?)",
+            ((f"n{i}", f"NODE.{i}", f"Node {i}", i % 4,
+              json.dumps({"payment": True, "multisig": i % 3, "roles": ["Aaron", "Elysia"]}))
+             for i in range(rows)),
+        )
+    db.close()
+
+
+def _live(before, after):
+    stats = after.compare_to(before, "filename")
+    return sum(s.count_diff for s in stats), sum(s.size_diff for s in stats)
+
+
+async def _measure(db: SovereignSQLite, rows: int):
+    query = "SELECT id, code, label, tier, policy FROM nodes LIMIT ?"
+    await db.fetch(query, rows)  # warm statement cache and row shapes
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    start = time.perf_counter()
+    result = await db.fetch(query, rows)
+    fetch_s = time.perf_counter() - start
+    fetched = _live(before, tracemalloc.take_snapshot())
+    start = time.perf_counter()
+    for _ in range(2):
+        for r in result:
+            policy = r["policy"]
+            if isinstance(policy, str):
+                policy = json.loads(policy)
+    policy_s = time.perf_counter() - start
+    tracemalloc.stop()
+    del result
+    return fetched, fetch_s, policy_s
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--rows", type=int, default=10000)
+    args = ap.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.db")
+        _seed(path, args.rows)
+        results = {}
+        for row_type in ("dict", "compact"):
+            db = SovereignSQLite(path, row_type=row_type)
+            results[row_type] = asyncio.run(_measure(db, args.rows))
+            db.close()
+
+    print(f"{args.rows} rows fetched and held; policy then read twice per row")
+    print(f"  {'row type':<8} {'live blocks':>12} {'live KiB':>10} {'fetch ms':>9} {'policy ms':>10}")
+    for row_type, ((blocks, size), fetch_s, policy_s) in results.items():
+        print(f"  {row_type:<8} {blocks:>12} {size / 1024:>10.0f} {fetch_s * 1000:>9.1f} {policy_s * 1000:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
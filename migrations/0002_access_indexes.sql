@@ -0,0 +1,23 @@
+-- migrations/0002_access_indexes.sql
+-- Hot-path indexes for the access tables. Checked by `python -m app.query_plans`.
+
+-- has_access: approved row for (user, node)
+CREATE INDEX IF NOT EXISTS idx_access_user_node_status
+  ON user_node_access(user_id, node_id, status);
+
+-- /admin/pending: status filter, newest first, covering the listed columns
+CREATE INDEX IF NOT EXISTS idx_access_status_created
+  ON user_node_access(status, created_at, node_id, user_id, id);
+
+-- /admin/inspect/access: newest first
+CREATE INDEX IF NOT EXISTS idx_access_created
+  ON user_node_access(created_at);
+
+-- subscription cancellation: Stripe grants by subscription id
+CREATE INDEX IF NOT EXISTS idx_access_subscription
+  ON user_node_access(json_extract(meta, '$.subscription_id'))
+  WHERE source = 'stripe_payment';
+
+-- approvals by access request
+CREATE INDEX IF NOT EXISTS idx_approvals_access
+  ON user_node_approvals(access_id);
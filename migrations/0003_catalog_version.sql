@@ -0,0 +1,25 @@
+-- migrations/0003_catalog_version.sql
+-- Version counter for the in-process node catalog (app/catalog.py).
+-- Any change to nodes bumps it, whoever makes it; the catalog polls this row.
+
+CREATE TABLE IF NOT EXISTS catalog_version (
+  name TEXT PRIMARY KEY,
+  version INTEGER NOT NULL DEFAULT 0
+);
+
+INSERT OR IGNORE INTO catalog_version (name, version) VALUES ('nodes', 1);
+
+CREATE TRIGGER IF NOT EXISTS trg_nodes_version_insert AFTER INSERT ON nodes
+BEGIN
+  UPDATE catalog_version SET version = version + 1 WHERE name = 'nodes';
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_nodes_version_update AFTER UPDATE ON nodes
+BEGIN
+  UPDATE catalog_version SET version = version + 1 WHERE name = 'nodes';
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_nodes_version_delete AFTER DELETE ON nodes
+BEGIN
+  UPDATE catalog_version SET version = version + 1 WHERE name = 'nodes';
+END;
@@ -0,0 +1,38 @@
+-- migrations/0004_user_entitlements.sql
+-- Effective access per (user, node), derived from the user_node_access history.
+-- Written in the same transaction as every grant/revoke (app/entitlements.py);
+-- `python -m app.entitlements rebuild` regenerates it from history.
+
+CREATE TABLE IF NOT EXISTS user_entitlements (
+  user_id TEXT NOT NULL,
+  node_id TEXT NOT NULL,
+  unlocked INTEGER NOT NULL DEFAULT 0,
+  source TEXT,
+  access_id TEXT,
+  expires_at TIMESTAMP,
+  updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+  PRIMARY KEY (user_id, node_id),
+  FOREIGN KEY(user_id) REFERENCES users(id),
+  FOREIGN KEY(node_id) REFERENCES nodes(id)
+);
+
+-- bulk entitlement load at startup: unlocked rows only, covering
+CREATE INDEX IF NOT EXISTS idx_entitlements_unlocked
+  ON user_entitlements(user_id, node_id, expires_at)
+  WHERE unlocked = 1;
+
+-- backfill from existing history (same ranking as the rebuild command)
+INSERT OR IGNORE INTO user_entitlements (user_id, node_id, unlocked, source, access_id, expires_at, updated_at)
+SELECT user_id, node_id, unlocked, source, id, expires_at, datetime('now') FROM (
+  SELECT user_id, node_id, id, source, expires_at,
+         CASE WHEN status = 'approved' THEN 1 ELSE 0 END AS unlocked,
+         ROW_NUMBER() OVER (
+           PARTITION BY user_id, node_id
+           ORDER BY CASE WHEN status = 'approved' THEN 0 ELSE 1 END,
+                    CASE WHEN expires_at IS NULL THEN 0 ELSE 1 END,
+                    expires_at DESC, updated_at DESC
+         ) AS pick
+  FROM user_node_access
+  WHERE status IN ('approved', 'expired', 'revoked')
+) ranked
+WHERE pick = 1;
@@ -0,0 +1,30 @@
+-- migrations/0005_approval_tallies.sql
+-- Multisig approvals (app/enforcement.py approve_access): one vote per approver
+-- per request, and a running tally per (request, role) updated with each vote,
+-- so quorum checks never rescan user_node_approvals.
+
+-- keep the latest vote if an approver voted more than once
+DELETE FROM user_node_approvals
+WHERE rowid NOT IN (SELECT MAX(rowid) FROM user_node_approvals GROUP BY access_id, approver_id);
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_approvals_access_approver
+  ON user_node_approvals(access_id, approver_id);
+
+-- superseded by the unique index above (same leading column)
+DROP INDEX IF EXISTS idx_approvals_access;
+
+CREATE TABLE IF NOT EXISTS user_node_approval_tallies (
+  access_id TEXT NOT NULL,
+  role TEXT NOT NULL,
+  approvals INTEGER NOT NULL DEFAULT 0,
+  rejections INTEGER NOT NULL DEFAULT 0,
+  PRIMARY KEY (access_id, role),
+  FOREIGN KEY(access_id) REFERENCES user_node_access(id)
+);
+
+INSERT OR IGNORE INTO user_node_approval_tallies (access_id, role, approvals, rejections)
+SELECT access_id, role,
+       SUM(CASE WHEN decision = 'approved' THEN 1 ELSE 0 END),
+       SUM(CASE WHEN decision = 'approved' THEN 0 ELSE 1 END)
+FROM user_node_approvals
+GROUP BY access_id, role;
@@ -0,0 +1,15 @@
+-- migrations/0006_open_request_unique.sql
+-- At most one open ('requested') access request per (user, node); repeat requests
+-- coalesce into it (app/enforcement.py request_access).
+
+-- earlier duplicates: keep the first request open, park the rest
+UPDATE user_node_access
+SET status = 'coalesced', updated_at = datetime('now')
+WHERE status = 'requested'
+  AND rowid NOT IN (
+    SELECT MIN(rowid) FROM user_node_access WHERE status = 'requested' GROUP BY user_id, node_id
+  );
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_access_open_request
+  ON user_node_access(user_id, node_id)
+  WHERE status = 'requested';
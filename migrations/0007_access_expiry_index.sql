@@ -0,0 +1,7 @@
+-- migrations/0007_access_expiry_index.sql
+-- Expiry sweeper (app/expiry.py): grants with an expiry by status, soonest first.
+-- (status, expires_at) serves the status match, the due range and the ORDER BY.
+
+CREATE INDEX IF NOT EXISTS idx_access_expiry
+  ON user_node_access(status, expires_at)
+  WHERE expires_at IS NOT NULL;
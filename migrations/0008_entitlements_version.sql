@@ -0,0 +1,21 @@
+-- migrations/0008_entitlements_version.sql
+-- Version counter for the in-process entitlement stores (app/entitlements.py).
+-- Any change to user_entitlements bumps it, whoever makes it (another worker,
+-- `python -m app.entitlements rebuild`, manual SQL); each process polls this row.
+
+INSERT OR IGNORE INTO catalog_version (name, version) VALUES ('user_entitlements', 1);
+
+CREATE TRIGGER IF NOT EXISTS trg_entitlements_version_insert AFTER INSERT ON user_entitlements
+BEGIN
+  UPDATE catalog_version SET version = version + 1 WHERE name = 'user_entitlements';
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_entitlements_version_update AFTER UPDATE ON user_entitlements
+BEGIN
+  UPDATE catalog_version SET version = version + 1 WHERE name = 'user_entitlements';
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_entitlements_version_delete AFTER DELETE ON user_entitlements
+BEGIN
+  UPDATE catalog_version SET version = version + 1 WHERE name = 'user_entitlements';
+END;
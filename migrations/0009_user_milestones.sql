@@ -0,0 +1,29 @@
+-- migrations/0009_user_milestones.sql
+-- Milestones a user has earned outside the node lattice (``glyph``, ``pull_mode``,
+-- ``initiation``, ...). A policy ``requires`` name that matches no node is one of
+-- these (app/prerequisites.py). Names are stored lower-case, ``.`` written as ``_``.
+-- They load with the user's grants, so they bump the user_entitlements version too.
+
+CREATE TABLE IF NOT EXISTS user_milestones (
+  user_id TEXT NOT NULL,
+  name TEXT NOT NULL,
+  source TEXT,
+  created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+  PRIMARY KEY (user_id, name),
+  FOREIGN KEY(user_id) REFERENCES users(id)
+);
+
+CREATE TRIGGER IF NOT EXISTS trg_milestones_version_insert AFTER INSERT ON user_milestones
+BEGIN
+  UPDATE catalog_version SET version = version + 1 WHERE name = 'user_entitlements';
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_milestones_version_update AFTER UPDATE ON user_milestones
+BEGIN
+  UPDATE catalog_version SET version = version + 1 WHERE name = 'user_entitlements';
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_milestones_version_delete AFTER DELETE ON user_milestones
+BEGIN
+  UPDATE catalog_version SET version = version + 1 WHERE name = 'user_entitlements';
+END;
@@ -0,0 +1,48 @@
+# tests/test_backup_retention.py
+import asyncio
+import os
+import sqlite3
+import pytest
+
+pytest.importorskip("cryptography")
+from app import backup_protocol
+from app.backup_protocol import arkwell_protocol, select_retained
+
+@pytest.fixture
+def vault(tmp_path, monkeypatch):
+    db_path = str(tmp_path / "kingdom.db")
+    with sqlite3.connect(db_path) as conn:
+        conn.execute("CREATE TABLE t (v TEXT)")
+        conn.execute("INSERT INTO t VALUES ('arkwell')")
+    vault_dir = str(tmp_path / "vault")
+    os.makedirs(vault_dir)
+    monkeypatch.setattr(backup_protocol, "PG_DSN", None)
+    monkeypatch.setattr(backup_protocol, "DB_PATH", db_path)
+    monkeypatch.setattr(backup_protocol, "BACKUP_DIR", vault_dir)
+    monkeypatch.setattr(backup_protocol, "CHUNK_STORE_DIR", os.path.join(vault_dir, "chunks"))
+    monkeypatch.setattr(backup_protocol, "VAULT_KEY_PATH", os.path.join(vault_dir, "vault.key"))
+    monkeypatch.setattr(backup_protocol, "CATALOG_PATH", os.path.join(vault_dir, "catalog.json"))
+    monkeypatch.setattr(backup_protocol, "_catalog", None)
+    monkeypatch.setattr(backup_protocol, "_vault_lock", asyncio.Lock())
+    return vault_dir
+
+def test_back_to_back_backups_keep_the_latest(vault):
+    """Backups within one second never reuse an id, and retention keeps the one written last."""
+    async def run():
+        ids = []
+        for _ in range(3):
+            ids.append((await arkwell_protocol.create_encrypted_backup(mode="incremental"))["mission_id"])
+            result = await arkwell_protocol.prune_backups(keep_hourly=1, keep_daily=0)
+            assert result["kept"] == 1
+        return ids
+
+    ids = asyncio.run(run())
+    assert len(set(ids)) == 3
+    assert [e["mission_id"] for e in backup_protocol.load_catalog()] == [ids[-1]]
+    assert os.path.exists(os.path.join(vault, f"{ids[-1]}.manifest.json"))
+
+def test_retention_ties_go_by_catalog_order():
+    stamp = "20260101T120000Z"
+    # catalog order is oldest first; the newest id sorts lowest
+    entries = [{"mission_id": m, "timestamp_utc": stamp} for m in ("z_oldest", "m_middle", "a_newest")]
+    assert select_retained(entries, keep_hourly=1, keep_daily=0) == {"a_newest"}